@@ -1,47 +1,24 @@
 # app.py
 
 import customtkinter
-import downloader
 import threading
 import os
-import json
 from tkinter import filedialog
+from bandwidth import BandwidthScheduler
+from config_manager import ConfigManager
+from dedupe import ContentDeduper
+from downloader import MetadataCache
+from download_index import DownloadIndex
+from engine import DownloadEngine
+from ingest import UrlStream, dedupe_urls
+from journal import JobJournal
+from metrics import MetricsRegistry
+from postprocess import PostProcessStage
+from scheduling import JobScheduler, format_duration
+from segmented import SegmentTuner
+from progress import ProgressBus, ConsoleProgressPrinter
 from ui_theme import SciFiTheme # Modular Architecture (SoC)
 
-# --- CONFIGURATION MANAGER ---
-class ConfigManager:
-    """Handles loading and saving application configuration from a JSON file."""
-    def __init__(self, config_path="config.json"):
-        self.config_path = config_path
-        self.config = self._load_config()
-
-    def _load_config(self):
-        """Loads configuration from the JSON file."""
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Fallback to a default configuration if file is missing or corrupt
-            # In a real-world scenario, you might want to create a default file here.
-            print("ERROR: config.json not found or corrupted. Using fallback.")
-            return json.loads("""
-                {"general": {"app_name": "Zenith Downloader", "author": "Sardar Wafa Abbas", "config_file_name": "zenith_config.json"},
-                 "downloader": {"quality_options": ["1080p", "720p", "Audio Only (MP3)"], "manual_mode_url_limit": 5, "bulk_mode_file": "links.txt", "default_output_path": "downloads", "video_subdirectory": "Video", "audio_subdirectory": "Audio"},
-                 "ui_text": {"title_manual_mode": ">> ENTER URLS (MAX %d) <<", "title_bulk_mode": ">> BULK MODE <<", "bulk_mode_label": "Bulk Mode (from %s)"}}
-            """)
-
-    def get(self, key, default=None):
-        """Get a value from the nested config dictionary."""
-        keys = key.split('.')
-        value = self.config
-        try:
-            for k in keys:
-                value = value[k]
-            return value
-        except (KeyError, TypeError):
-            return default
-
-
 # --- MAIN APPLICATION ---
 class App(customtkinter.CTk):
     def __init__(self, config: ConfigManager):
@@ -49,6 +26,21 @@ class App(customtkinter.CTk):
         
         self.config = config
         self.stop_event = threading.Event()
+        self.engine = None
+        self.download_index = DownloadIndex(self.config.get('downloader.index_file', 'zenith_index.db'))
+        self.metadata_cache = MetadataCache.from_config(self.config)
+        self.dedupe = ContentDeduper.from_config(self.config, self.download_index)
+        self.journal = JobJournal(self.config.get('downloader.journal_file', 'zenith_journal.jsonl'))
+        self.bandwidth = BandwidthScheduler.from_config(self.config)
+        self.segment_tuner = SegmentTuner.from_config(self.config)
+        self.postprocess_stage = PostProcessStage.from_config(self.config)
+        self.metrics = MetricsRegistry.from_config(self.config)
+        self._job_progress = {} # job_id -> latest progress dict, only touched on the Tk thread
+        # Download threads publish into the bus; it flushes to the GUI and console at a fixed frame rate.
+        self.progress_bus = ProgressBus(fps=self.config.get('downloader.progress_fps', 10))
+        self.progress_bus.subscribe(self._on_progress_frame)
+        self.progress_bus.subscribe(ConsoleProgressPrinter())
+        self.progress_bus.start()
         self.output_path_config_file = self.config.get('general.config_file_name', 'zenith_config.json')
         self.output_path = self._load_saved_output_path()
         os.makedirs(self.output_path, exist_ok=True)
@@ -161,13 +153,7 @@ class App(customtkinter.CTk):
 
     def _load_saved_output_path(self):
         """Loads the last used output path from a simple text file."""
-        try:
-            with open(self.output_path_config_file, "r") as f:
-                path = f.read().strip()
-                if path and os.path.isdir(path): return path
-        except FileNotFoundError:
-            pass
-        return self.config.get('downloader.default_output_path', 'downloads')
+        return self.config.saved_output_path()
 
     def _save_output_path(self):
         """Saves the current output path for future sessions."""
@@ -211,10 +197,11 @@ class App(customtkinter.CTk):
         self.download_button.pack_forget()
         self.stop_button.pack(fill="x", ipady=8)
         self.reset_progress_ui()
+        self._job_progress.clear()
         threading.Thread(target=self.run_downloader, daemon=True).start()
 
     def stop_download(self):
-        self.status_label.configure(text="SYS.STATUS: Halting process... Awaiting current file to finish.")
+        self.status_label.configure(text="SYS.STATUS: Halting process... Partial files are kept and resume next run.")
         self.stop_event.set()
         self.stop_button.configure(state="disabled", text="...HITTING THE BRAKES...")
 
@@ -226,26 +213,40 @@ class App(customtkinter.CTk):
                 self.restore_ui_state()
                 return # Exit if no URLs were found or validation failed
             
-            selected_quality = self.quality_menu.get()
-            total_targets = len(urls)
-            video_subdir = self.config.get('downloader.video_subdirectory', 'Video')
-            audio_subdir = self.config.get('downloader.audio_subdirectory', 'Audio')
+            download_options = {
+                'output_path': self.output_path,
+                'quality_choice': self.quality_menu.get(),
+                'video_subdir': self.config.get('downloader.video_subdirectory', 'Video'),
+                'audio_subdir': self.config.get('downloader.audio_subdirectory', 'Audio'),
+                'prefer_progressive': self.config.get('downloader.formats.prefer_progressive', True),
+                'keep_native_audio': self.config.get('downloader.formats.keep_native_audio', False),
+                'download_index': self.download_index,
+                'metadata_cache': self.metadata_cache,
+                'segment_tuner': self.segment_tuner,
+                'dedupe': self.dedupe,
+            }
+            self.engine = DownloadEngine(download_options,
+                                         max_workers=self.config.get('downloader.max_workers', 4),
+                                         per_host_limit=self.config.get('downloader.per_host_limit', 3),
+                                         stop_event=self.stop_event,
+                                         progress_callback=self.update_progress,
+                                         job_callback=self.update_job_status,
+                                         max_pending=self.config.get('downloader.max_pending', 1000),
+                                         journal=self.journal, abort_on_stop=True, bandwidth=self.bandwidth,
+                                         expand_playlists=self.config.get('downloader.expand_playlists', True),
+                                         max_retries=self.config.get('downloader.job_retries', 2),
+                                         postprocess_stage=self.postprocess_stage, metrics=self.metrics,
+                                         scheduler=JobScheduler.from_config(self.config))
+            self.status_label.configure(text=f"SYS.STATUS: Processing targets on {self.engine.max_workers} workers...")
+            self.engine.run(urls)
             
-            for i, url in enumerate(urls, 1):
-                if self.stop_event.is_set():
-                    self.status_label.configure(text=f"SYS.STATUS: Download halted by user. {i-1} targets processed.")
-                    break
-                
-                self.status_label.configure(text=f"SYS.STATUS: Processing target {i} of {total_targets}...")
-                self.video_title_label.configure(text=f"TARGET: {url}...")
-                self.update_idletasks()
-
-                downloader.download_video(url, self.output_path, selected_quality,
-                                          progress_callback=self.update_progress,
-                                          video_subdir=video_subdir, audio_subdir=audio_subdir)
-            
-            if not self.stop_event.is_set():
-                self.status_label.configure(text=f"SYS.STATUS: All {total_targets} transfers complete. Mission accomplished.")
+            total_targets = self.engine.targets
+            processed = self.engine.completed + self.engine.failed
+            if self.stop_event.is_set():
+                self.status_label.configure(text=f"SYS.STATUS: Download halted by user. {processed} targets processed.")
+            else:
+                failed_note = f" ({self.engine.failed} failed)" if self.engine.failed else ""
+                self.status_label.configure(text=f"SYS.STATUS: All {total_targets} transfers complete{failed_note}. Mission accomplished.")
         
         except Exception as e:
             self.status_label.configure(text=f"SYS.CRITICAL_ERROR: {e}")
@@ -255,19 +256,20 @@ class App(customtkinter.CTk):
             self.after(0, self.restore_ui_state)
 
     def _get_urls_from_source(self):
-        """Modular logic to get URLs from either the textbox or bulk file."""
+        """
+        Modular logic to get URLs from either the textbox or bulk file.
+        Bulk mode returns a lazy, de-duplicated stream so huge files start downloading immediately.
+        """
         if self.bulk_mode_switch.get() == 1:
             bulk_file = self.config.get('downloader.bulk_mode_file', 'links.txt')
-            try:
-                with open(bulk_file, "r") as f:
-                    urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-                if not urls:
-                    self.status_label.configure(text=f"SYS.ERROR: {bulk_file} is empty or contains no valid URLs.")
-                    return None
-                return urls
-            except FileNotFoundError:
+            if not os.path.isfile(bulk_file):
                 self.status_label.configure(text=f"SYS.ERROR: {bulk_file} not found.")
                 return None
+            stream = UrlStream.from_config(bulk_file, self.config)
+            if not stream.has_urls():
+                self.status_label.configure(text=f"SYS.ERROR: {bulk_file} is empty or contains no valid URLs.")
+                return None
+            return stream
         else:
             urls = [url.strip() for url in self.url_textbox.get("1.0", "end").split("\n") if url.strip()]
             limit = self.config.get('downloader.manual_mode_url_limit', 5)
@@ -277,11 +279,56 @@ class App(customtkinter.CTk):
             if not urls:
                 self.status_label.configure(text="SYS.ERROR: No target vectors provided.")
                 return None
-            return urls
+            return dedupe_urls(urls)
             
-    def update_progress(self, progress_dict):
-        # GUI updates must run on the main thread, self.after ensures this.
-        self.after(0, self.update_gui_elements, progress_dict)
+    def update_progress(self, job, progress_dict):
+        # Called on download threads: only record the latest value, the bus paces GUI updates.
+        self.progress_bus.publish(job.job_id, progress_dict)
+
+    def _on_progress_frame(self, updates, finished):
+        # GUI updates must run on the main thread, self.after ensures this. One callback per frame.
+        self.after(0, self._apply_progress_frame, updates)
+
+    def update_job_status(self, job):
+        """Called by engine workers whenever a job starts or finishes."""
+        engine = self.engine
+        if engine is None or self.stop_event.is_set():
+            return
+        done = engine.completed + engine.failed
+        text = f"SYS.STATUS: {done} of {engine.targets} targets processed, {engine.active} active..."
+        eta = engine.eta()
+        if eta is not None:
+            text += f" Queue ETA {format_duration(eta)}."
+        self.after(0, lambda: self.status_label.configure(text=text))
+        if job.status in ("done", "failed"):
+            self.after(0, self._job_progress.pop, job.job_id, None)
+
+    def _apply_progress_frame(self, updates):
+        self._job_progress.update(updates)
+        latest = next(reversed(updates.values()))
+        self.update_gui_elements(self._aggregate_progress(latest))
+
+    def _aggregate_progress(self, latest):
+        """Folds the latest progress of every active job into one dict of the shape yt-dlp emits."""
+        if len(self._job_progress) <= 1:
+            return latest
+        downloading = [p for p in self._job_progress.values() if p.get('status') == 'downloading']
+        if not downloading:
+            return latest
+        dl_bytes = sum(p.get('downloaded_bytes') or 0 for p in downloading)
+        total_bytes = sum(p.get('total_bytes') or p.get('total_bytes_estimate') or 0 for p in downloading)
+        speed = sum(p.get('speed') or 0 for p in downloading)
+        eta = max((p.get('eta') or 0 for p in downloading), default=0)
+        title = latest.get('info_dict', {}).get('title', '')
+        return {
+            'status': 'downloading',
+            'downloaded_bytes': dl_bytes,
+            'total_bytes': total_bytes,
+            'speed': speed,
+            '_speed_str': f"{self._format_bytes(speed)}/s",
+            '_eta_str': f"{eta}s",
+            'info_dict': {'title': f"[{len(downloading)} active] {title}"},
+        }
     
     def update_gui_elements(self, p):
         """Refactored to safely handle progress dictionary keys."""
@@ -0,0 +1,240 @@
+# bandwidth.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """
+    Token bucket in "debt" form: consuming always succeeds immediately and returns how long
+    the caller must sleep to stay within `rate` bytes/sec. A rate of None means unlimited.
+    """
+    def __init__(self, rate=None, burst_seconds=0.5):
+        self.burst_seconds = burst_seconds
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        self._refill(time.monotonic())
+        self.rate = float(rate) if rate else None
+        if self.rate is not None:
+            # Clamp both credit and debt so a rate change never implies more than one burst of waiting.
+            limit = self.rate * self.burst_seconds
+            self.tokens = max(-limit, min(self.tokens, limit))
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.rate * self.burst_seconds, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, nbytes, now=None):
+        if self.rate is None:
+            return 0.0
+        self._refill(now or time.monotonic())
+        self.tokens -= nbytes
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Transfer:
+    """One active download's handle on the scheduler."""
+    def __init__(self, scheduler, key, host, weight, limit):
+        self.scheduler = scheduler
+        self.key = key
+        self.host = host
+        self.weight = max(0.01, float(weight))
+        self.limit = limit  # optional per-job cap in bytes/sec
+        self.bucket = TokenBucket()
+        self.allocation = None  # bytes/sec granted by the last rebalance
+        self.rate = 0.0  # exponentially smoothed observed throughput
+        self.last_sample = None  # throughput over the most recent rebalance window...
+        self.sample_allocation = None  # ...and the allocation that was in force during it
+        self.bytes = 0
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+        self._last_seen = {}  # file -> downloaded_bytes, to turn progress totals into deltas
+
+    def observe(self, filename, downloaded_bytes):
+        """Converts a progress dict's running total for `filename` into newly transferred bytes."""
+        if downloaded_bytes is None:
+            return 0
+        last = self._last_seen.get(filename)
+        self._last_seen[filename] = downloaded_bytes
+        # The first report for a file includes any resumed bytes; only count what follows.
+        return max(0, downloaded_bytes - last) if last is not None else 0
+
+    def consume(self, nbytes, cancel_event=None):
+        """Accounts for `nbytes` and sleeps as long as the global, host and job budgets require."""
+        if nbytes <= 0:
+            return
+        deadline = time.monotonic() + self.scheduler._consume(self, nbytes)
+        # Sleep in short slices and re-check this transfer's own bucket, so a larger allocation
+        # from a rebalance (another transfer finishing, a raised limit) takes effect mid-wait.
+        while True:
+            now = time.monotonic()
+            wait = max(deadline - now, self.scheduler._own_wait(self, now))
+            if wait <= 0:
+                return
+            if cancel_event is not None:
+                if cancel_event.wait(min(wait, self.scheduler.WAIT_SLICE)):
+                    return
+            else:
+                time.sleep(min(wait, self.scheduler.WAIT_SLICE))
+
+
+class BandwidthScheduler:
+    """
+    Process-wide bandwidth budget shared by every active transfer.
+    A global token bucket enforces the total bytes/sec; optional per-host buckets cap each site.
+    Within those caps, the budget is split by weighted max-min fairness: each transfer is
+    offered a share in proportion to its weight, and whatever a slow or small transfer does
+    not use is handed to the others, so one 4K stream cannot starve short clips.
+    Limits can be changed at any time and take effect on the next rebalance.
+    """
+    REBALANCE_INTERVAL = 0.5
+    SMOOTHING = 0.5  # weight of the newest throughput sample
+    MIN_DEMAND = 64 * 1024  # an idle transfer keeps at least this much so it can ramp back up
+    WAIT_SLICE = 0.1
+
+    def __init__(self, global_limit=None, per_host_limit=None, per_job_limit=None):
+        self._lock = threading.Lock()
+        self.global_limit = global_limit or None
+        self.per_host_limit = per_host_limit or None
+        self.per_job_limit = per_job_limit or None
+        self._global = TokenBucket(self.global_limit)
+        self._hosts = {}  # host -> TokenBucket
+        self._transfers = {}
+        self._last_rebalance = 0.0
+        self.total_bytes = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the scheduler from the `downloader.bandwidth` section; 0 means unlimited."""
+        return cls(global_limit=config.get('downloader.bandwidth.global_bps', 0),
+                   per_host_limit=config.get('downloader.bandwidth.per_host_bps', 0),
+                   per_job_limit=config.get('downloader.bandwidth.per_job_bps', 0))
+
+    # --- Runtime configuration ---
+    def set_global_limit(self, bytes_per_sec):
+        with self._lock:
+            self.global_limit = bytes_per_sec or None
+            self._global.set_rate(self.global_limit)
+            self._rebalance(time.monotonic())
+
+    def set_per_host_limit(self, bytes_per_sec):
+        with self._lock:
+            self.per_host_limit = bytes_per_sec or None
+            for bucket in self._hosts.values():
+                bucket.set_rate(self.per_host_limit)
+            self._rebalance(time.monotonic())
+
+    # --- Transfers ---
+    @contextmanager
+    def transfer(self, key, host="", weight=1.0, limit=None):
+        """Registers an active transfer for the duration of the block."""
+        handle = Transfer(self, key, host, weight, limit or self.per_job_limit)
+        with self._lock:
+            self._transfers[key] = handle
+            if host not in self._hosts:
+                self._hosts[host] = TokenBucket(self.per_host_limit)
+            self._rebalance(time.monotonic())
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                self._transfers.pop(key, None)
+                if not any(t.host == host for t in self._transfers.values()):
+                    self._hosts.pop(host, None)
+                self._rebalance(time.monotonic())
+
+    def snapshot(self):
+        """Current allocation and observed rate per transfer, for dashboards and benchmarks."""
+        with self._lock:
+            return {key: {'allocation': t.allocation, 'rate': t.rate, 'bytes': t.bytes, 'weight': t.weight}
+                    for key, t in self._transfers.items()}
+
+    def _consume(self, transfer, nbytes):
+        """Charges `nbytes` to every bucket; returns the wait owed to the shared (global and host) ones."""
+        now = time.monotonic()
+        with self._lock:
+            if transfer._window_bytes == 0:
+                # Measure from the first byte, not from registration or the end of an idle spell.
+                transfer._window_start = now
+            transfer.bytes += nbytes
+            transfer._window_bytes += nbytes
+            self.total_bytes += nbytes
+            if now - self._last_rebalance >= self.REBALANCE_INTERVAL:
+                self._rebalance(now)
+            transfer.bucket.consume(nbytes, now)
+            waits = [self._global.consume(nbytes, now)]
+            host_bucket = self._hosts.get(transfer.host)
+            if host_bucket is not None:
+                waits.append(host_bucket.consume(nbytes, now))
+        return max(waits)
+
+    def _own_wait(self, transfer, now):
+        """Seconds until `transfer` has paid off its own debt at its current allocation."""
+        with self._lock:
+            if now - self._last_rebalance >= self.REBALANCE_INTERVAL:
+                self._rebalance(now)
+            return transfer.bucket.consume(0, now)
+
+    def _rebalance(self, now):
+        """Weighted max-min (water-filling) split of the budget; caller holds the lock."""
+        self._last_rebalance = now
+        transfers = list(self._transfers.values())
+        for t in transfers:
+            elapsed = now - t._window_start
+            # No sample until the first byte: time spent extracting says nothing about demand.
+            if t.bytes and elapsed >= self.REBALANCE_INTERVAL / 2:
+                t.last_sample = sample = t._window_bytes / elapsed
+                t.sample_allocation = t.allocation
+                t.rate = sample if not t.rate else self.SMOOTHING * sample + (1 - self.SMOOTHING) * t.rate
+            t._window_bytes, t._window_start = 0, now
+
+        # Split each host's cap among its transfers, then the global budget among all of them.
+        caps = {t.key: t.limit for t in transfers}
+        if self.per_host_limit:
+            by_host = {}
+            for t in transfers:
+                by_host.setdefault(t.host, []).append(t)
+            for group in by_host.values():
+                for key, share in _water_fill(group, self.per_host_limit, caps, self.MIN_DEMAND).items():
+                    caps[key] = share
+        shares = _water_fill(transfers, self.global_limit, caps, self.MIN_DEMAND) if self.global_limit else caps
+        for t in transfers:
+            t.allocation = shares.get(t.key)
+            t.bucket.set_rate(t.allocation)
+
+
+def _water_fill(transfers, budget, caps, min_demand):
+    """
+    Weighted max-min fair shares of `budget`. A transfer's demand is its cap, or unbounded if it
+    used most of its allocation over the last window; a transfer running well below its
+    allocation is treated as wanting only a little more than its observed rate (never less than
+    `min_demand`), and the rest flows to others. As soon as it saturates that smaller
+    allocation its demand is unbounded again, so it gets its full share back within one window.
+    """
+    demands = {}
+    for t in transfers:
+        demand = caps.get(t.key) or float('inf')
+        if t.sample_allocation and t.last_sample is not None and t.last_sample < 0.8 * t.sample_allocation:
+            demand = min(demand, max(min_demand, t.rate * 1.5))
+        demands[t.key] = demand
+    shares, remaining, active = {}, float(budget), list(transfers)
+    while active and remaining > 1e-6:
+        total_weight = sum(t.weight for t in active)
+        satisfied = [t for t in active if demands[t.key] <= remaining * t.weight / total_weight]
+        if not satisfied:
+            for t in active:
+                shares[t.key] = remaining * t.weight / total_weight
+            return shares
+        for t in satisfied:
+            shares[t.key] = demands[t.key]
+            remaining -= demands[t.key]
+            active.remove(t)
+    for t in active:
+        shares[t.key] = max(1.0, remaining / len(active)) if remaining > 0 else 1.0
+    return shares
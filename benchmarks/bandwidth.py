@@ -0,0 +1,106 @@
+# benchmarks/bandwidth.py
+"""
+Global bandwidth budget, fair sharing and runtime re-limiting against the local media server.
+Run from the repository root:  python -m benchmarks.bandwidth --limit-mib 20
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+
+from bandwidth import BandwidthScheduler
+from benchmarks.media_server import MediaServer
+from engine import DownloadEngine
+
+MIB = 1024 * 1024
+
+
+def sample_throughput(scheduler, stop, samples, interval=0.25):
+    last_bytes, last_time = scheduler.total_bytes, time.monotonic()
+    while not stop.wait(interval):
+        now, total = time.monotonic(), scheduler.total_bytes
+        samples.append((now, (total - last_bytes) / (now - last_time)))
+        last_bytes, last_time = total, now
+
+
+def run(limit, big_mib, small_count, small_mib, workers, relimit_after):
+    scheduler = BandwidthScheduler(global_limit=limit)
+    finished = {}
+    started = time.monotonic()
+
+    def on_job(job):
+        if job.status in ("done", "failed"):
+            finished[job.url] = (job.status, time.monotonic() - started)
+
+    with MediaServer() as server, tempfile.TemporaryDirectory() as output_path:
+        urls = [server.media_url("big", size=big_mib * MIB)]
+        urls += [server.media_url(f"small-{n}", size=small_mib * MIB) for n in range(small_count)]
+        engine = DownloadEngine({'output_path': output_path, 'quality_choice': "1080p (Best Video)"},
+                                max_workers=workers, per_host_limit=workers, job_callback=on_job, bandwidth=scheduler)
+        samples, stop = [], threading.Event()
+        sampler = threading.Thread(target=sample_throughput, args=(scheduler, stop, samples), daemon=True)
+        sampler.start()
+        relimit_at = None
+        if relimit_after:
+            def relimit():
+                nonlocal relimit_at
+                relimit_at = time.monotonic()
+                scheduler.set_global_limit(limit // 2)
+            timer = threading.Timer(relimit_after, relimit)
+            timer.start()
+        engine.run(urls)
+        stop.set()
+        sampler.join()
+        elapsed = time.monotonic() - started
+
+    def mean_rate(after, before):
+        window = [rate for t, rate in samples if after <= t < before]
+        return sum(window) / len(window) if window else None
+
+    # Skip the first second (ramp-up) when judging steady-state throughput.
+    phase1_end = relimit_at or float('inf')
+    small_done = [t for url, (status, t) in finished.items() if "small-" in url and status == "done"]
+    result = {
+        "limit_bps": limit,
+        "elapsed_s": round(elapsed, 2),
+        "total_mib": round(scheduler.total_bytes / MIB, 1),
+        "mean_bps_phase1": mean_rate(started + 1.0, phase1_end),
+        "small_jobs_done": len(small_done),
+        "small_jobs_last_done_s": round(max(small_done), 2) if small_done else None,
+        "big_job_done_s": round(next((t for url, (s, t) in finished.items() if "/big." in url), 0), 2),
+    }
+    if relimit_at:
+        result["relimited_bps"] = limit // 2
+        result["mean_bps_phase2"] = mean_rate(relimit_at + 1.0, float('inf'))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit-mib", type=float, default=20, help="global budget in MiB/s")
+    parser.add_argument("--big-mib", type=int, default=200)
+    parser.add_argument("--small", type=int, default=6, help="number of small jobs")
+    parser.add_argument("--small-mib", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--relimit-after", type=float, default=4.0, help="halve the budget after N seconds (0 = never)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    result = run(int(args.limit_mib * MIB), args.big_mib, args.small, args.small_mib, args.workers, args.relimit_after)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    fmt = lambda bps: f"{bps / MIB:6.2f} MiB/s" if bps else "   n/a"
+    print(f"budget {fmt(result['limit_bps'])}: measured {fmt(result['mean_bps_phase1'])}")
+    if "relimited_bps" in result:
+        print(f"budget {fmt(result['relimited_bps'])}: measured {fmt(result['mean_bps_phase2'])}")
+    print(f"{result['small_jobs_done']} small jobs done by {result['small_jobs_last_done_s']}s; "
+          f"big job done at {result['big_job_done_s']}s; {result['total_mib']} MiB in {result['elapsed_s']}s")
+
+
+if __name__ == "__main__":
+    main()
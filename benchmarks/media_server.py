@@ -0,0 +1,236 @@
+# benchmarks/media_server.py
+
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# Paths look like /media/<name>.<ext>?size=<bytes>; the body is a repeatable byte pattern.
+# Optional rate=<bytes/sec> caps each response and latency=<ms> delays each one, like a far-away CDN.
+MEDIA_PATH = re.compile(r"^/media/(?P<name>[\w.-]+)\.(?P<ext>mp4|m4a|webm|ts|m4s)$")
+# /feed/<name>.rss?count=<n>&size=<bytes>[&broken=<i>,<j>] is an RSS playlist of media files;
+# the listed (1-based) entries point at a missing file.
+FEED_PATH = re.compile(r"^/feed/(?P<name>[\w.-]+)\.rss$")
+# /hls/<name>.m3u8 and /dash/<name>.mpd with ?segments=<n>&size=<bytes per segment> describe a
+# stream cut into media segments; rate and latency are passed on to every segment.
+HLS_PATH = re.compile(r"^/hls/(?P<name>[\w.-]+)\.m3u8$")
+DASH_PATH = re.compile(r"^/dash/(?P<name>[\w.-]+)\.mpd$")
+CONTENT_TYPES = {"mp4": "video/mp4", "m4a": "audio/mp4", "webm": "video/webm", "ts": "video/mp2t",
+                 "m4s": "video/iso.segment"}
+DEFAULT_SIZE = 256 * 1024
+SEGMENT_SECONDS = 4
+
+
+def synthetic_bytes(start, end):
+    """Deterministic payload for the byte range [start, end)."""
+    pattern = bytes(range(256))
+    offset = start % 256
+    length = end - start
+    repeats = (offset + length) // 256 + 1
+    return (pattern * repeats)[offset:offset + length]
+
+
+def _link_params(rate, latency_ms):
+    return (f"&rate={rate}" if rate else "") + (f"&latency={latency_ms}" if latency_ms else "")
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves synthetic media files over keep-alive HTTP/1.1 with Range support."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Benchmarks should not be slowed down by access logging
+
+    def setup(self):
+        super().setup()
+        self.server.stats_increment("connections")
+
+    def _query(self):
+        path, _, query = self.path.partition("?")
+        return path, dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+
+    def _parse(self):
+        path, params = self._query()
+        match = MEDIA_PATH.match(path)
+        if not match:
+            return None
+        size = int(params.get("size", DEFAULT_SIZE))
+        return match.group("ext"), size, int(params.get("rate", 0)), int(params.get("latency", 0)) / 1000
+
+    def _send_manifest(self):
+        """Serves a feed, HLS playlist or DASH manifest; returns False if the path is none of them."""
+        path, params = self._query()
+        for pattern, build, content_type in ((FEED_PATH, self._feed, "application/rss+xml"),
+                                             (HLS_PATH, self._hls, "application/vnd.apple.mpegurl"),
+                                             (DASH_PATH, self._dash, "application/dash+xml")):
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return False
+        if params.get("latency"):
+            time.sleep(int(params["latency"]) / 1000)
+        body = build(match.group("name"), params).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "GET":
+            self.wfile.write(body)
+        return True
+
+    @staticmethod
+    def _passed_on(params):
+        """The query string rate and latency add to every URL a manifest lists."""
+        return "".join(f"&{key}={params[key]}" for key in ("rate", "latency") if key in params)
+
+    def _feed(self, name, params):
+        size = int(params.get("size", DEFAULT_SIZE))
+        broken = {int(i) for i in params.get("broken", "").split(",") if i}
+        items = []
+        for i in range(1, int(params.get("count", 10)) + 1):
+            folder = "missing" if i in broken else "media"
+            url = f"{self.server.base_url}/{folder}/{name}-{i:03d}.mp4?size={size}{self._passed_on(params)}"
+            items.append(f'<item><title>{name} {i}</title><guid>{name}-{i:03d}</guid>'
+                         f'<enclosure url="{escape(url)}" type="video/mp4" length="{size}"/></item>')
+        return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>{name}</title>'
+                f'{"".join(items)}</channel></rss>')
+
+    def _hls(self, name, params):
+        size, extra = int(params.get("size", DEFAULT_SIZE)), self._passed_on(params)
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(int(params.get("segments", 10))):
+            lines += [f"#EXTINF:{SEGMENT_SECONDS:.1f},", f"/media/{name}-seg-{i:05d}.ts?size={size}{extra}"]
+        return "\n".join(lines + ["#EXT-X-ENDLIST", ""])
+
+    def _dash(self, name, params):
+        size, extra = int(params.get("size", DEFAULT_SIZE)), escape(self._passed_on(params))
+        count = int(params.get("segments", 10))
+        bandwidth = size * 8 // SEGMENT_SECONDS
+        # One muxed representation, so no merge (and no ffmpeg) is needed to play it.
+        return (f'<?xml version="1.0"?>'
+                f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S" '
+                f'mediaPresentationDuration="PT{count * SEGMENT_SECONDS}S" '
+                f'profiles="urn:mpeg:dash:profile:isoff-live:2011"><Period>'
+                f'<AdaptationSet mimeType="video/mp4" segmentAlignment="true">'
+                f'<Representation id="muxed" codecs="avc1.4d401f,mp4a.40.2" bandwidth="{bandwidth}" '
+                f'width="1280" height="720">'
+                f'<SegmentTemplate timescale="1" duration="{SEGMENT_SECONDS}" startNumber="1" '
+                f'initialization="/media/{name}-init.m4s?size=1024{extra}" '
+                f'media="/media/{name}-seg-$Number$.m4s?size={size}{extra}"/>'
+                f'</Representation></AdaptationSet></Period></MPD>')
+
+    def _send_headers(self, ext, size, rate=0, latency=0.0):
+        if latency:
+            time.sleep(latency)
+        start, end, status = 0, size, 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            m = re.match(r"bytes=(\d*)-(\d*)", range_header)
+            if m and (m.group(1) or m.group(2)):
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = min(size, int(m.group(2)) + 1) if m.group(2) else size
+                else:
+                    start = max(0, size - int(m.group(2)))
+                status = 206
+        if start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES[ext])
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        return start, end
+
+    def do_HEAD(self):
+        if self._send_manifest():
+            return
+        parsed = self._parse()
+        if parsed is None:
+            self.send_error(404)
+            return
+        self._send_headers(*parsed)
+
+    def do_GET(self):
+        self.server.stats_increment("requests")
+        if self._send_manifest():
+            return
+        parsed = self._parse()
+        if parsed is None:
+            self.send_error(404)
+            return
+        span = self._send_headers(*parsed)
+        if span is None:
+            return
+        start, end = span
+        rate = parsed[2]
+        chunk = 64 * 1024 if not rate else max(4096, min(64 * 1024, rate // 20))
+        began = time.monotonic()
+        for pos in range(start, end, chunk):
+            data = synthetic_bytes(pos, min(end, pos + chunk))
+            self.wfile.write(data)
+            self.server.stats_increment("bytes_sent", len(data))  # counted as sent, so aborted bodies count too
+            if rate:
+                ahead = (pos + chunk - start) / rate - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+class MediaServer(ThreadingHTTPServer):
+    """A local stand-in for a media CDN, started on an ephemeral port."""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), MediaRequestHandler)
+        self._stats_lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "bytes_sent": 0}
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients such as yt-dlp's generic extractor hang up mid-body on purpose; that is not a failure.
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def stats_increment(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def media_url(self, name, ext="mp4", size=DEFAULT_SIZE, rate=0, latency_ms=0):
+        url = f"{self.base_url}/media/{name}.{ext}?size={size}"
+        return url + _link_params(rate, latency_ms)
+
+    def playlist_url(self, name, count=10, size=DEFAULT_SIZE, broken=(), rate=0, latency_ms=0):
+        url = f"{self.base_url}/feed/{name}.rss?count={count}&size={size}"
+        url += f"&broken={','.join(map(str, broken))}" if broken else ""
+        return url + _link_params(rate, latency_ms)
+
+    def hls_url(self, name, segments=10, size=DEFAULT_SIZE, rate=0, latency_ms=0):
+        url = f"{self.base_url}/hls/{name}.m3u8?segments={segments}&size={size}"
+        return url + _link_params(rate, latency_ms)
+
+    def dash_url(self, name, segments=10, size=DEFAULT_SIZE, rate=0, latency_ms=0):
+        url = f"{self.base_url}/dash/{name}.mpd?segments={segments}&size={size}"
+        return url + _link_params(rate, latency_ms)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,122 @@
+# benchmarks/segmented.py
+"""
+Single-connection versus segmented (multi-connection Range) downloads from a rate-capped server.
+Run from the repository root:  python -m benchmarks.segmented --size-mib 48 --rate-mib 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import downloader
+from benchmarks.media_server import MediaServer, synthetic_bytes
+from segmented import SegmentTuner
+
+MIB = 1024 * 1024
+QUALITY = "1080p (Best Video)"
+
+
+def verify(path, size):
+    """True if the file holds exactly the server's synthetic payload."""
+    if os.path.getsize(path) != size:
+        return False
+    with open(path, "rb") as f:
+        for pos in range(0, size, MIB):
+            if f.read(MIB) != synthetic_bytes(pos, min(size, pos + MIB)):
+                return False
+    return True
+
+
+def download(server, url, output_path, tuner, cancel_after=None):
+    cancel_event = threading.Event()
+    timer = threading.Timer(cancel_after, cancel_event.set) if cancel_after else None
+    if timer:
+        timer.start()
+    pool = downloader.SessionPool()
+    before = dict(server.stats)
+    started = time.perf_counter()
+    try:
+        ok = downloader.download_video(url, output_path, QUALITY, session_pool=pool, cancel_event=cancel_event,
+                                       segment_tuner=tuner)
+    finally:
+        pool.close()
+        if timer:
+            timer.cancel()
+    return ok, time.perf_counter() - started, {k: server.stats[k] - before[k] for k in before}
+
+
+def run_mode(server, name, size, rate, latency_ms, tuner):
+    with tempfile.TemporaryDirectory() as output_path:
+        url = server.media_url(name, size=size, rate=rate, latency_ms=latency_ms)
+        ok, elapsed, stats = download(server, url, output_path, tuner)
+        path = os.path.join(output_path, "Video", f"{name} [{name}].mp4")
+        intact = ok and verify(path, size)
+    return {
+        "mode": "segmented" if tuner else "single",
+        "ok": ok,
+        "intact": intact,
+        "seconds": round(elapsed, 2),
+        "mib_per_s": round(size / MIB / elapsed, 2),
+        "requests": stats["requests"],
+        "connections": stats["connections"],
+    }
+
+
+def run_resume(server, size, rate, latency_ms, tuner, halt_after):
+    """Halts a segmented download part-way, then runs it again: only the holes are fetched."""
+    with tempfile.TemporaryDirectory() as output_path:
+        url = server.media_url("resume", size=size, rate=rate, latency_ms=latency_ms)
+        _, first_s, first = download(server, url, output_path, tuner, cancel_after=halt_after)
+        ok, second_s, second = download(server, url, output_path, tuner)
+        intact = ok and verify(os.path.join(output_path, "Video", "resume [resume].mp4"), size)
+    return {
+        "mode": "halt+resume",
+        "ok": ok,
+        "intact": intact,
+        "seconds": round(first_s + second_s, 2),
+        "mib_before_halt": round(first["bytes_sent"] / MIB, 1),
+        "mib_after_resume": round(second["bytes_sent"] / MIB, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mib", type=int, default=48, help="file size")
+    parser.add_argument("--rate-mib", type=float, default=4, help="per-connection server cap in MiB/s")
+    parser.add_argument("--latency-ms", type=int, default=40, help="delay before each response")
+    parser.add_argument("--max-connections", type=int, default=8)
+    parser.add_argument("--halt-after", type=float, default=2.0, help="seconds before halting the resume run (0 = skip)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    size, rate = args.size_mib * MIB, int(args.rate_mib * MIB)
+    results = []
+    with MediaServer() as server:
+        results.append(run_mode(server, "single", size, rate, args.latency_ms, None))
+        tuner = SegmentTuner(max_connections=args.max_connections)
+        results.append(run_mode(server, "cold", size, rate, args.latency_ms, tuner))
+        # The same tuner again: it starts at the connection count and chunk size it learned.
+        warm = run_mode(server, "warm", size, rate, args.latency_ms, tuner)
+        warm["mode"] = "segmented (warm)"
+        results.append(warm)
+        if args.halt_after:
+            results.append(run_resume(server, size, rate, args.latency_ms,
+                                      SegmentTuner(max_connections=args.max_connections), args.halt_after))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    for r in results:
+        extra = (f"{r['mib_before_halt']} MiB before halt, {r['mib_after_resume']} MiB after resume"
+                 if "mib_before_halt" in r else
+                 f"{r['mib_per_s']:6.2f} MiB/s, {r['requests']} requests on {r['connections']} connections")
+        print(f"{r['mode']:>17}: {r['seconds']:6.2f}s, {extra}, ok={r['ok']} intact={r['intact']}")
+
+
+if __name__ == "__main__":
+    main()
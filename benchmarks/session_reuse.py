@@ -0,0 +1,78 @@
+# benchmarks/session_reuse.py
+"""
+Per-URL overhead of a fresh YoutubeDL per call versus the pooled sessions in downloader.py.
+Run from the repository root:  python -m benchmarks.session_reuse --urls 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import downloader
+from benchmarks.media_server import MediaServer
+
+QUALITY = "1080p (Best Video)"
+
+
+def run_fresh(urls, output_path):
+    """The pre-pool behaviour: one YoutubeDL built and torn down for every URL."""
+    for url in urls:
+        ydl_opts = downloader.build_ydl_opts(output_path, QUALITY)
+        # The planned 'format' option needs downloader's YoutubeDL subclass to be understood.
+        with downloader._staging_youtube_dl()(ydl_opts) as ydl:
+            ydl.download([url])
+
+
+def run_pooled(urls, output_path):
+    pool = downloader.SessionPool()
+    try:
+        for url in urls:
+            downloader.download_video(url, output_path, QUALITY, session_pool=pool)
+    finally:
+        pool.close()
+
+
+def measure(name, runner, server, count, size):
+    with tempfile.TemporaryDirectory() as output_path:
+        urls = [server.media_url(f"{name}-{n}", size=size) for n in range(count)]
+        before = dict(server.stats)
+        started = time.perf_counter()
+        runner(urls, output_path)
+        elapsed = time.perf_counter() - started
+        saved = len(os.listdir(os.path.join(output_path, "Video")))
+    return {
+        "mode": name,
+        "urls": count,
+        "downloaded": saved,
+        "total_s": round(elapsed, 4),
+        "per_url_ms": round(elapsed / count * 1000, 2),
+        "connections": server.stats["connections"] - before["connections"],
+        "requests": server.stats["requests"] - before["requests"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--urls", type=int, default=30, help="number of URLs per mode")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="bytes per synthetic clip")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    with MediaServer() as server:
+        results = [measure(name, runner, server, args.urls, args.size)
+                   for name, runner in (("fresh", run_fresh), ("pooled", run_pooled))]
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for r in results:
+            print(f"{r['mode']:>7}: {r['per_url_ms']:8.2f} ms/url  "
+                  f"({r['downloaded']}/{r['urls']} saved, {r['connections']} connections, {r['requests']} requests)")
+
+
+if __name__ == "__main__":
+    main()
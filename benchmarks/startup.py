@@ -0,0 +1,57 @@
+# benchmarks/startup.py
+"""
+Process startup cost of the GUI entry point versus the headless CLI.
+Run from the repository root:  python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Each probe imports everything its entry point needs before the first job can be queued.
+PROBES = {
+    "gui": "import app",
+    "headless": "import cli; cli.HeadlessRunner(cli.ConfigManager(), '720p', 'downloads')",
+    "yt_dlp": "import yt_dlp",  # reference: what the headless path defers until the first job
+}
+
+
+def time_probe(code, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+        samples.append(elapsed * 1000)
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {name: time_probe(code, args.runs) for name, code in PROBES.items()}
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:>9}: unavailable ({r['error']})")
+        else:
+            print(f"{name:>9}: median {r['median_ms']:7.1f} ms  (min {r['min_ms']:.1f} ms over {r['runs']} runs)")
+
+
+if __name__ == "__main__":
+    main()
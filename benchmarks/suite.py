@@ -0,0 +1,341 @@
+# benchmarks/suite.py
+"""
+Offline benchmark suite: drives download_video and the bulk pipeline against the local media server.
+Run from the repository root:  python -m benchmarks.suite --quick --output bench.json [--baseline old.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import downloader
+from bandwidth import BandwidthScheduler
+from benchmarks.media_server import MediaServer
+from download_index import DownloadIndex
+from engine import DownloadEngine
+from ingest import UrlStream
+from journal import JobJournal
+from postprocess import PostProcessStage
+from progress import ProgressBus
+from segmented import SegmentTuner
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MIB = 1024 * 1024
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUALITY = "720p"
+
+# Sizes per profile; "quick" keeps the whole suite to well under a minute for CI.
+PROFILES = {
+    "full": {"big_mib": 64, "rate_mib": 4, "latency_ms": 40, "segments": 40, "segment_kib": 512,
+             "tiny_urls": 60, "hook_files": 8, "bulk_urls": 80, "feed_entries": 20},
+    "quick": {"big_mib": 16, "rate_mib": 4, "latency_ms": 20, "segments": 12, "segment_kib": 256,
+              "tiny_urls": 20, "hook_files": 4, "bulk_urls": 24, "feed_entries": 6},
+}
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (MIB if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB elsewhere
+
+
+def timed_download(url, tuner=None, **kwargs):
+    """One download_video call into a fresh folder; returns (ok, seconds)."""
+    pool = downloader.SessionPool()
+    with tempfile.TemporaryDirectory() as output_path:
+        started = time.perf_counter()
+        try:
+            ok = downloader.download_video(url, output_path, QUALITY, session_pool=pool, segment_tuner=tuner, **kwargs)
+        finally:
+            pool.close()
+        return ok, time.perf_counter() - started
+
+
+class HookMeter:
+    """Wraps downloader.ytdlp_progress_hook to count calls and the CPU time spent inside them."""
+    def __init__(self):
+        self.calls = 0
+        self.cpu_ns = 0
+        self._lock = threading.Lock()
+        self._original = downloader.ytdlp_progress_hook
+
+    def __enter__(self):
+        def hook(d, progress_callback=None):
+            started = time.thread_time_ns()
+            self._original(d, progress_callback)
+            elapsed = time.thread_time_ns() - started
+            with self._lock:
+                self.calls += 1
+                self.cpu_ns += elapsed
+        downloader.ytdlp_progress_hook = hook
+        return self
+
+    def __exit__(self, *exc):
+        downloader.ytdlp_progress_hook = self._original
+
+
+class FrameCounter:
+    """ProgressBus subscriber standing in for the GUI: counts frames and the snapshots in them."""
+    def __init__(self):
+        self.frames = 0
+        self.snapshots = 0
+
+    def __call__(self, updates, finished):
+        self.frames += 1
+        self.snapshots += len(updates) + len(finished)
+
+
+# --- Scenarios ---
+def scenario_throughput(server, p):
+    """One large progressive file over a slow, far-away link: one connection vs. segmented."""
+    size = p["big_mib"] * MIB
+    url = lambda name: server.media_url(name, size=size, rate=int(p["rate_mib"] * MIB), latency_ms=p["latency_ms"])
+    single_ok, single_s = timed_download(url("single"))
+    segmented_ok, segmented_s = timed_download(url("segmented"), SegmentTuner())
+    return {
+        "ok": single_ok and segmented_ok,
+        "single_mib_per_s": round(size / MIB / single_s, 2),
+        "segmented_mib_per_s": round(size / MIB / segmented_s, 2),
+    }
+
+
+def scenario_fragmented(server, p):
+    """HLS and DASH streams fetched fragment by fragment, with concurrent fragments."""
+    kwargs = dict(segments=p["segments"], size=p["segment_kib"] * 1024, rate=int(p["rate_mib"] * MIB),
+                  latency_ms=p["latency_ms"])
+    size_mib = p["segments"] * p["segment_kib"] / 1024
+    hls_ok, hls_s = timed_download(server.hls_url("hls", **kwargs), SegmentTuner())
+    dash_ok, dash_s = timed_download(server.dash_url("dash", **kwargs), SegmentTuner())
+    return {
+        "ok": hls_ok and dash_ok,
+        "hls_mib_per_s": round(size_mib / hls_s, 2),
+        "dash_mib_per_s": round(size_mib / dash_s, 2),
+    }
+
+
+def scenario_setup_overhead(server, p):
+    """Per-URL cost of tiny files, where setup rather than transfer dominates."""
+    pool = downloader.SessionPool()
+    before = dict(server.stats)
+    urls = [server.media_url(f"tiny-{n}", size=16 * 1024) for n in range(p["tiny_urls"])]
+    with tempfile.TemporaryDirectory() as output_path:
+        started = time.perf_counter()
+        ok = downloader.download_video(urls[0], output_path, QUALITY, session_pool=pool)
+        first_s = time.perf_counter() - started
+        for url in urls[1:]:
+            ok = downloader.download_video(url, output_path, QUALITY, session_pool=pool) and ok
+        total_s = time.perf_counter() - started
+    pool.close()
+    warm = len(urls) - 1
+    return {
+        "ok": ok,
+        "first_url_ms": round(first_s * 1000, 1),  # includes importing yt-dlp and its extractors
+        "per_url_ms": round((total_s - first_s) / warm * 1000, 2),
+        "requests_per_url": round((server.stats["requests"] - before["requests"]) / len(urls), 2),
+    }
+
+
+def scenario_progress_hooks(server, p):
+    """CPU cost of the progress hook path and the rate at which the GUI would be called back."""
+    bus = ProgressBus(fps=10)
+    frames = bus.subscribe(FrameCounter())
+    urls = [server.media_url(f"hooks-{n}", size=4 * MIB, rate=2 * MIB) for n in range(p["hook_files"])]
+    with tempfile.TemporaryDirectory() as output_path, HookMeter() as meter:
+        engine = DownloadEngine({'output_path': output_path, 'quality_choice': QUALITY},
+                                max_workers=4, per_host_limit=4,
+                                progress_callback=lambda job, d: bus.publish(job.job_id, d))
+        bus.start()
+        started = time.perf_counter()
+        engine.run(urls)
+        elapsed = time.perf_counter() - started
+        bus.stop()
+    return {
+        "ok": engine.failed == 0,
+        "hook_calls_per_s": round(meter.calls / elapsed, 1),
+        "hook_cpu_us_per_call": round(meter.cpu_ns / max(1, meter.calls) / 1000, 2),
+        "hook_cpu_share_pct": round(meter.cpu_ns / 1e9 / elapsed * 100, 3),
+        "gui_callbacks_per_s": round(frames.frames / elapsed, 2),
+        "snapshots_per_callback": round(frames.snapshots / max(1, frames.frames), 2),
+    }
+
+
+def scenario_bulk(server, p):
+    """The headless bulk pipeline end to end: links file, dedupe, playlist fan-out, manifests, stage."""
+    before = dict(server.stats)
+    bus = ProgressBus(fps=10)
+    frames = bus.subscribe(FrameCounter())
+    with tempfile.TemporaryDirectory() as workdir:
+        links = os.path.join(workdir, "links.txt")
+        with open(links, "w", encoding="utf-8") as f:
+            for n in range(p["bulk_urls"]):
+                url = server.media_url(f"bulk-{n}", size=512 * 1024, latency_ms=p["latency_ms"])
+                f.write(url + "\n")
+                if n % 4 == 0:
+                    f.write(url + "\n")  # duplicate lines are dropped by the stream
+            f.write(server.playlist_url("bulkfeed", count=p["feed_entries"], size=512 * 1024) + "\n")
+            f.write(server.hls_url("bulkhls", segments=p["segments"], size=p["segment_kib"] * 1024) + "\n")
+            f.write(server.dash_url("bulkdash", segments=p["segments"], size=p["segment_kib"] * 1024) + "\n")
+        index = DownloadIndex(os.path.join(workdir, "index.db"))
+        journal = JobJournal(os.path.join(workdir, "journal.jsonl"), fsync=False)
+        stage = PostProcessStage()
+        options = {'output_path': os.path.join(workdir, "out"), 'quality_choice': QUALITY, 'download_index': index,
+                   'metadata_cache': downloader.MetadataCache(), 'segment_tuner': SegmentTuner()}
+        engine = DownloadEngine(options, max_workers=4, per_host_limit=4, journal=journal,
+                                bandwidth=BandwidthScheduler(), postprocess_stage=stage,
+                                progress_callback=lambda job, d: bus.publish(job.job_id, d))
+        stream = UrlStream(links, checkpoint_path=None)
+        bus.start()
+        started = time.perf_counter()
+        engine.run(stream)
+        elapsed = time.perf_counter() - started
+        bus.stop()
+        stage.close()
+        journal.close()
+        index.close()
+    sent = server.stats["bytes_sent"] - before["bytes_sent"]
+    return {
+        "ok": engine.failed == 0,
+        "jobs": engine.targets,
+        "failed": engine.failed,
+        "seconds": round(elapsed, 2),
+        "jobs_per_s": round(engine.targets / elapsed, 2),
+        "bulk_mib_per_s": round(sent / MIB / elapsed, 2),
+        "gui_callbacks_per_s": round(frames.frames / elapsed, 2),
+    }
+
+
+SCENARIOS = {
+    "throughput": scenario_throughput,
+    "fragmented": scenario_fragmented,
+    "setup_overhead": scenario_setup_overhead,
+    "progress_hooks": scenario_progress_hooks,
+    "bulk": scenario_bulk,
+}
+
+
+# --- Regression check ---
+def direction(metric):
+    """+1 if a larger value is better, -1 if smaller is better, 0 if the metric is informational."""
+    if metric.endswith("_per_s") and not metric.startswith("gui_") and not metric.startswith("hook_calls"):
+        return 1
+    if metric.endswith(("_ms", "_us_per_call", "_pct", "peak_rss_mib")) or metric == "seconds":
+        return -1
+    return 0
+
+
+def compare(report, baseline, tolerance):
+    """Lists (scenario, metric, baseline, current, change) for every metric worse by more than `tolerance`."""
+    regressions = []
+    for name, metrics in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name, {})
+        for metric, value in metrics.items():
+            sign = direction(metric)
+            before = old.get(metric)
+            if not sign or not isinstance(value, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            if change * sign < -tolerance:
+                regressions.append((name, metric, before, value, change))
+    return regressions
+
+
+# --- Running ---
+def run_scenario(name, profile):
+    """Runs one scenario in this process and returns its metrics."""
+    with MediaServer() as server:
+        started = time.perf_counter()
+        try:
+            metrics = SCENARIOS[name](server, PROFILES[profile])
+        except Exception as e:
+            metrics = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        metrics["wall_s"] = round(time.perf_counter() - started, 2)
+    metrics["peak_rss_mib"] = peak_rss_mib()
+    return metrics
+
+
+def run_isolated(name, profile):
+    """Runs one scenario in a fresh interpreter so its startup and peak RSS are its own."""
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--run-one", name, "--profile", profile],
+                          cwd=ROOT, capture_output=True, text=True)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"
+        return {"ok": False, "error": error}
+
+
+def environment():
+    yt_dlp = downloader._import_yt_dlp()
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "yt_dlp": yt_dlp.version.__version__}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="full")
+    parser.add_argument("--quick", action="store_const", const="quick", dest="profile", help="same as --profile quick")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        print(json.dumps(run_scenario(args.run_one, args.profile)))
+        return 0
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    report = {
+        "suite": "zenith-benchmarks",
+        "version": 1,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "profile": args.profile,
+        "environment": environment(),
+        "scenarios": {},
+    }
+    for name in names:
+        if not args.json:
+            print(f"[bench] {name}...", flush=True)
+        report["scenarios"][name] = run_isolated(name, args.profile)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for name, metrics in report["scenarios"].items():
+            print(f"{name:>15}: " + ", ".join(f"{k}={v}" for k, v in metrics.items()))
+
+    failed = [name for name, metrics in report["scenarios"].items() if not metrics.get("ok")]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, metric, before, value, change in regressions:
+            print(f"[bench] REGRESSION {name}.{metric}: {before} -> {value} ({change:+.0%})", file=sys.stderr)
+    for name in failed:
+        print(f"[bench] FAILED {name}: {report['scenarios'][name].get('error', 'a download failed')}", file=sys.stderr)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
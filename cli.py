@@ -0,0 +1,389 @@
+# cli.py
+"""
+Headless entry point for servers: no Tk, and yt_dlp is only imported once the first job runs.
+
+    python cli.py run [URL ...] [--file links.txt] [--quality 720p] [--output DIR] [--workers N] [--limit 5M] [--show-plans]
+                   [--metrics-file jobs.jsonl] [--metrics-port 9464] [--policy sjf]
+    python cli.py daemon [--file links.txt] [--poll 5]
+    python cli.py index-rebuild
+    python cli.py enqueue [URL ...] [--file links.txt] [--retry-failed] [--queue /shared/zenith_queue.db]
+    python cli.py worker [--poll 5] [--exit-when-idle] [--queue /shared/zenith_queue.db]
+    python cli.py queue-status [--queue /shared/zenith_queue.db]
+
+Options such as --quality or --queue may come before or after the command.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+from collections import Counter
+
+from bandwidth import BandwidthScheduler
+from config_manager import ConfigManager
+from download_index import DownloadIndex
+from downloader import MetadataCache
+from dedupe import ContentDeduper
+from engine import DownloadEngine
+from journal import JobJournal
+from postprocess import PostProcessStage
+from metrics import MetricsRegistry
+from scheduling import POLICIES, JobScheduler, format_duration
+from segmented import SegmentTuner
+from workqueue import QueueWorker, WorkQueue
+from ingest import Deduplicator, UrlStream, dedupe_urls, parse_link_line, url_key
+from progress import ProgressBus, ConsoleProgressPrinter
+
+
+def iter_url_lines(lines):
+    """Yields the URLs in a links file, skipping blanks and # comments like the GUI does."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def parse_rate(text):
+    """Parses a bytes/sec limit such as '500K', '5M' or '1.5G' (binary units); 0 means unlimited."""
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().removesuffix('/S').removesuffix('B')
+    suffix = text[-1:] if text[-1:] in units else ''
+    try:
+        return int(float(text[:len(text) - len(suffix)]) * units[suffix])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate '{text}', expected e.g. 500K or 5M")
+
+
+def resolve_quality(config, requested):
+    """Maps a CLI quality such as '720p' or 'audio' onto one of the configured quality options."""
+    options = config.get('downloader.quality_options', [])
+    if not requested:
+        return options[0] if options else "1080p (Best Video)"
+    for option in options:
+        if requested.lower() in option.lower():
+            return option
+    raise SystemExit(f"Unknown quality '{requested}'. Choose from: {', '.join(options)}")
+
+
+class BulkFileTailer:
+    """
+    Reads URLs appended to a links file since the last poll, like `tail -f`, dropping duplicates.
+    Tagged lines come back as (url, options) pairs.
+    Lines are read one at a time as the consumer takes them, so a large backlog is never held in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.deduplicator = Deduplicator()
+
+    def poll(self):
+        """Yields the new URLs; stopping early leaves the lines not yet read for the next poll."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size < self.offset:
+            self.offset = 0  # File was truncated or replaced; start over
+        if size == self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Only consume complete lines; a half-written last line is picked up next poll
+                self.offset += len(raw)
+                for line in iter_url_lines([raw.decode("utf-8", errors="replace")]):
+                    url, options = parse_link_line(line)
+                    if not self.deduplicator.seen(url_key(url)):
+                        yield (url, options) if options else url
+
+
+class HeadlessRunner:
+    """Wires the download engine to a console-only progress bus."""
+    def __init__(self, config, quality_choice, output_path, max_workers=None, bandwidth_limit=None, show_plans=False,
+                 metrics_file=None, metrics_port=None, policy=None, work_queue=None):
+        self.config = config
+        self.show_plans = show_plans
+        self.plan_counts = Counter()
+        self.plan_cpu_seconds = 0.0
+        self.stop_event = threading.Event()
+        self.download_index = DownloadIndex(config.get('downloader.index_file', 'zenith_index.db'))
+        self.metadata_cache = MetadataCache.from_config(config)
+        self.dedupe = ContentDeduper.from_config(config, self.download_index)
+        # A worker of a shared queue resumes through its leases instead of a local journal.
+        self.journal = (JobJournal(config.get('downloader.journal_file', 'zenith_journal.jsonl'))
+                        if work_queue is None else None)
+        self.queue_worker = QueueWorker.from_config(config, work_queue) if work_queue is not None else None
+        self.bandwidth = BandwidthScheduler.from_config(config)
+        self.segment_tuner = SegmentTuner.from_config(config)
+        self.postprocess_stage = PostProcessStage.from_config(config)
+        self.metrics = MetricsRegistry.from_config(config, metrics_file, metrics_port)
+        self.scheduler = JobScheduler.from_config(config, policy)
+        if bandwidth_limit is not None:
+            self.bandwidth.set_global_limit(bandwidth_limit)
+        self.progress_bus = ProgressBus(fps=config.get('downloader.progress_fps', 10))
+        self.progress_bus.subscribe(ConsoleProgressPrinter(status=self._queue_status))
+        download_options = {
+            'output_path': output_path,
+            'quality_choice': quality_choice,
+            'video_subdir': config.get('downloader.video_subdirectory', 'Video'),
+            'audio_subdir': config.get('downloader.audio_subdirectory', 'Audio'),
+            'prefer_progressive': config.get('downloader.formats.prefer_progressive', True),
+            'keep_native_audio': config.get('downloader.formats.keep_native_audio', False),
+            'download_index': self.download_index,
+            'metadata_cache': self.metadata_cache,
+            'segment_tuner': self.segment_tuner,
+            'dedupe': self.dedupe,
+        }
+        self.engine = DownloadEngine(download_options,
+                                     max_workers=max_workers or config.get('downloader.max_workers', 4),
+                                     per_host_limit=config.get('downloader.per_host_limit', 3),
+                                     stop_event=self.stop_event,
+                                     progress_callback=lambda job, d: self.progress_bus.publish(job.job_id, d),
+                                     job_callback=self._on_job,
+                                     max_pending=config.get('downloader.max_pending', 1000),
+                                     journal=self.journal, abort_on_stop=True, bandwidth=self.bandwidth,
+                                     expand_playlists=config.get('downloader.expand_playlists', True),
+                                     # A queue worker retries through the queue, which counts every attempt.
+                                     max_retries=config.get('downloader.job_retries', 2) if work_queue is None else 0,
+                                     postprocess_stage=self.postprocess_stage, metrics=self.metrics,
+                                     scheduler=self.scheduler,
+                                     entry_sink=self.queue_worker.fan_out if self.queue_worker else None)
+
+    def _queue_status(self):
+        eta = self.engine.eta()
+        return f" | queue ETA {format_duration(eta)}" if eta is not None else ""
+
+    def _on_job(self, job):
+        if self.queue_worker is not None:
+            self.queue_worker.on_job(job)
+        if job.status in ("done", "failed"):
+            for plan in job.plans:
+                self.plan_counts[plan.audio_action or plan.kind] += 1
+                self.plan_cpu_seconds += plan.cpu_seconds or 0.0
+                if self.show_plans:
+                    print(f"\n[Zenith] PLAN: {job.url}: {plan.describe()}")
+        if job.status == "failed":
+            reason = f" ({job.error})" if job.error else ""
+            print(f"\n[Zenith] FAILED: {job.url}{reason}")
+
+    def install_signal_handlers(self):
+        def handle(signum, frame):
+            print(f"\n[Zenith] Received signal {signum}, halting; partial files resume on the next run...")
+            self.engine.stop()
+        signal.signal(signal.SIGINT, handle)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, handle)
+
+    def run(self, urls):
+        self.progress_bus.start()
+        try:
+            self.engine.run(urls)
+        finally:
+            self.progress_bus.stop()
+        return self.summary()
+
+    def daemon(self, bulk_file, poll_interval):
+        """Keeps the engine running and feeds it every line appended to `bulk_file`."""
+        tailer = BulkFileTailer(bulk_file)
+        self.progress_bus.start()
+        self.engine.start()
+        print(f"[Zenith] Daemon watching {bulk_file} (poll every {poll_interval}s). Ctrl+C to stop.")
+        try:
+            while not self.stop_event.is_set():
+                for item in tailer.poll():
+                    # submit() blocks while the engine's queue is full, so the file is read only as fast as it drains.
+                    if isinstance(item, tuple):
+                        self.engine.submit(*item)
+                    else:
+                        self.engine.submit(item)
+                    if self.stop_event.is_set():
+                        break
+                self.stop_event.wait(poll_interval)
+        finally:
+            self.engine.close()
+            self.engine.join()
+            self.progress_bus.stop()
+        return self.summary()
+
+    def worker(self, poll_interval, exit_when_idle=False):
+        """Runs jobs claimed from the shared work queue until stopped, or until it is empty."""
+        queue_worker = self.queue_worker
+        self.progress_bus.start()
+        self.engine.start()
+        queue_worker.start()
+        print(f"[Zenith] Worker {queue_worker.name} on {queue_worker.queue.db_path}. Ctrl+C to stop.")
+        try:
+            queue_worker.feed(self.engine, self.stop_event, poll_interval, exit_when_idle)
+        finally:
+            self.engine.close()
+            self.engine.join()
+            queue_worker.finish()
+            self.progress_bus.stop()
+        reported = ", ".join(f"{count} {'failed, queued for a retry' if status == 'queued' else status}"
+                             for status, count in queue_worker.reported.most_common())
+        print(f"\n[Zenith] Claimed {queue_worker.claimed} tasks; reported {reported or 'none'}."
+              + (f" {queue_worker.lost} leases were lost to other workers." if queue_worker.lost else ""))
+        return self.summary()
+
+    def summary(self):
+        engine = self.engine
+        if engine.resumed:
+            print(f"\n[Zenith] Resumed {engine.resumed} incomplete jobs from the journal.")
+        if engine.expanded:
+            print(f"[Zenith] Expanded {engine.expanded} playlists into individual jobs.")
+        if engine.retried:
+            print(f"[Zenith] Retried failed jobs {engine.retried} times.")
+        if self.plan_counts:
+            kinds = ", ".join(f"{count} {kind}" for kind, count in self.plan_counts.most_common())
+            print(f"[Zenith] Format plans: {kinds}; estimated post-processing CPU {self.plan_cpu_seconds:.1f}s.")
+        if self.dedupe is not None and (self.dedupe.reused or self.dedupe.linked):
+            print(f"[Zenith] Deduplicated: {self.dedupe.reused} linked instead of downloaded, "
+                  f"{self.dedupe.linked} identical after download; {self.dedupe.bytes_saved / 1048576:.1f} MiB stored once.")
+        if self.metrics is not None:
+            phases = ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in self.metrics.phase_totals().items())
+            if phases:
+                print(f"[Zenith] Time by phase (summed over jobs): {phases}.")
+            errors = ", ".join(f"{count} {error}" for (error,), count in
+                               sorted(self.metrics.errors.values.items(), key=lambda item: -item[1]))
+            if errors:
+                print(f"[Zenith] Errors: {errors}.")
+            self.metrics.close()
+        first, per_hour = self.scheduler.time_to_first_result, self.scheduler.items_per_hour()
+        if first is not None:
+            print(f"[Zenith] Scheduling ({self.scheduler.policy}): first result after {format_duration(first)}, "
+                  f"{per_hour:.0f} items/hour.")
+        print(f"\n[Zenith] {engine.completed} completed, {engine.failed} failed, {engine.pending} not started.")
+        return 0 if engine.failed == 0 else 1
+
+
+def common_options(argument_default=None):
+    """
+    The options accepted both before and after the command. The copy attached to each command
+    suppresses defaults, so an option only given before the command is not reset after it.
+    """
+    parser = argparse.ArgumentParser(add_help=False, argument_default=argument_default)
+    parser.add_argument("--config", help="path to config.json")
+    if argument_default is None:
+        parser.set_defaults(config="config.json")
+    parser.add_argument("--quality", help="quality option, e.g. 1080p, 720p, audio")
+    parser.add_argument("--output", help="download folder (defaults to the GUI's saved folder)")
+    parser.add_argument("--workers", type=int, help="override downloader.max_workers")
+    parser.add_argument("--show-plans", action="store_true", help="print the format plan chosen for every video")
+    parser.add_argument("--metrics-file", help="append one JSON line of timings per finished job to this file")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on 127.0.0.1:PORT/metrics while running")
+    parser.add_argument("--policy", choices=POLICIES,
+                        help="order of queued jobs (overrides downloader.scheduling.policy); tags in links files: "
+                             "priority=N deadline=2h|18:30")
+    parser.add_argument("--queue", help="shared work queue database (overrides downloader.work_queue.path)")
+    parser.add_argument("--limit", type=parse_rate, help="total bandwidth in bytes/sec, e.g. 5M (overrides downloader.bandwidth.global_bps)")
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Zenith Downloader (headless)", parents=[common_options()])
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = common_options(argparse.SUPPRESS)
+
+    run = sub.add_parser("run", parents=[common], help="download the given URLs or links file, then exit")
+    run.add_argument("urls", nargs="*", help="URLs or playlists to download")
+    run.add_argument("--file", help="links file to read (defaults to downloader.bulk_mode_file when no URLs given)")
+
+    daemon = sub.add_parser("daemon", parents=[common], help="keep running and download lines appended to the links file")
+    daemon.add_argument("--file", help="links file to watch (defaults to downloader.bulk_mode_file)")
+    daemon.add_argument("--poll", type=float, default=5.0, help="seconds between checks of the links file")
+
+    sub.add_parser("index-rebuild", parents=[common], help="re-create the download index by scanning the output folders")
+
+    enqueue = sub.add_parser("enqueue", parents=[common], help="add URLs or a links file to the shared work queue")
+    enqueue.add_argument("urls", nargs="*", help="URLs or playlists to queue")
+    enqueue.add_argument("--file", help="links file to queue (defaults to downloader.bulk_mode_file when no URLs given)")
+    enqueue.add_argument("--retry-failed", action="store_true", help="queue failed tasks again")
+
+    worker = sub.add_parser("worker", parents=[common], help="download jobs claimed from the shared work queue")
+    worker.add_argument("--poll", type=float, default=5.0, help="seconds between checks of an empty queue")
+    worker.add_argument("--exit-when-idle", action="store_true", help="exit once nothing is queued or running anywhere")
+
+    sub.add_parser("queue-status", parents=[common], help="show the shared work queue's tasks, workers and recent failures")
+    return parser
+
+
+def rebuild_index(config, output_path):
+    index = DownloadIndex(config.get('downloader.index_file', 'zenith_index.db'))
+    subdirs = (config.get('downloader.video_subdirectory', 'Video'), config.get('downloader.audio_subdirectory', 'Audio'))
+    try:
+        added, skipped = index.rebuild(output_path, subdirs)
+    finally:
+        index.close()
+    print(f"[Zenith] Indexed {added} files from {output_path}; {skipped} had no recoverable video id.")
+    return 0
+
+
+def enqueue(work_queue, urls, bulk_file, retry_failed):
+    if retry_failed:
+        print(f"[Zenith] Queued {work_queue.retry_failed()} failed tasks again.")
+    if urls:
+        items = dedupe_urls(urls)
+    elif os.path.isfile(bulk_file):
+        items = UrlStream(bulk_file)
+    elif retry_failed:
+        return 0
+    else:
+        print(f"[Zenith] ERROR: {bulk_file} not found.")
+        return 2
+    added = work_queue.enqueue(items)
+    counts = work_queue.counts()
+    print(f"[Zenith] Queued {added} new tasks on {work_queue.db_path}; {counts['queued']} waiting, {counts['leased']} running.")
+    return 0
+
+
+def queue_status(work_queue):
+    counts = work_queue.counts()
+    print(f"[Zenith] {work_queue.db_path}: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+    for name, held in sorted(work_queue.workers().items()):
+        print(f"  {name}: {held['leased']} leased")
+    for task in work_queue.results("failed", limit=10):
+        print(f"  FAILED after {task['attempts']} attempts: {task['url']} ({task['error']})")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = ConfigManager(args.config)
+    output_path = args.output or config.saved_output_path()
+    os.makedirs(output_path, exist_ok=True)
+    if args.command == "index-rebuild":
+        return rebuild_index(config, output_path)
+    bulk_file = getattr(args, "file", None) or config.get('downloader.bulk_mode_file', 'links.txt')
+    work_queue = WorkQueue.from_config(config, args.queue) if args.command in ("enqueue", "worker", "queue-status") else None
+    if args.command == "enqueue":
+        return enqueue(work_queue, args.urls, bulk_file, args.retry_failed)
+    if args.command == "queue-status":
+        return queue_status(work_queue)
+
+    runner = HeadlessRunner(config, resolve_quality(config, args.quality), output_path, args.workers, args.limit,
+                            args.show_plans, args.metrics_file, args.metrics_port, args.policy, work_queue)
+    runner.install_signal_handlers()
+
+    if args.command == "worker":
+        return runner.worker(args.poll, args.exit_when_idle)
+    if args.command == "daemon":
+        return runner.daemon(bulk_file, args.poll)
+
+    if args.urls:
+        return runner.run(dedupe_urls(args.urls))
+    if not os.path.isfile(bulk_file):
+        print(f"[Zenith] ERROR: {bulk_file} not found.")
+        return 2
+    stream = UrlStream.from_config(bulk_file, config)
+    status = runner.run(stream)
+    if stream.resumed:
+        print(f"[Zenith] Resumed {bulk_file} from a checkpoint.")
+    dedupe = stream.deduplicator
+    print(f"[Zenith] {dedupe.unique} unique URLs, {dedupe.duplicates + dedupe.probable_duplicates} duplicates skipped.")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# config_manager.py
+
+import os
+import json
+
+# --- CONFIGURATION MANAGER ---
+class ConfigManager:
+    """Handles loading and saving application configuration from a JSON file."""
+    def __init__(self, config_path="config.json"):
+        self.config_path = config_path
+        self.config = self._load_config()
+
+    def _load_config(self):
+        """Loads configuration from the JSON file."""
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Fallback to a default configuration if file is missing or corrupt
+            # In a real-world scenario, you might want to create a default file here.
+            print("ERROR: config.json not found or corrupted. Using fallback.")
+            return json.loads("""
+                {"general": {"app_name": "Zenith Downloader", "author": "Sardar Wafa Abbas", "config_file_name": "zenith_config.json"},
+                 "downloader": {"quality_options": ["1080p (Best Video)", "720p", "Audio Only (MP3)"], "manual_mode_url_limit": 5, "max_workers": 4, "per_host_limit": 3, "progress_fps": 10, "max_pending": 1000, "expand_playlists": true, "job_retries": 2, "bulk_mode_file": "links.txt", "default_output_path": "downloads", "video_subdirectory": "Video", "audio_subdirectory": "Audio", "index_file": "zenith_index.db", "journal_file": "zenith_journal.jsonl", "metadata_cache": {"path": "zenith_metadata.db", "max_entries": 2048, "max_disk_entries": 100000, "video_ttl": 21600, "playlist_ttl": 1800}, "ingest": {"checkpoint_file": "zenith_ingest.ckpt", "checkpoint_interval": 30, "bloom_capacity": 5000000, "bloom_error_rate": 0.00001, "recent_items": 100000}, "dedupe": {"enabled": true, "link_mode": "auto", "hash_after_download": true}, "formats": {"prefer_progressive": true, "keep_native_audio": false}, "segmented": {"enabled": true, "initial_connections": 2, "max_connections": 8, "min_size": 4194304, "min_chunk": 524288, "max_chunk": 33554432, "chunk_seconds": 2.0, "fragment_connections": 4}, "postprocess": {"workers": 0, "max_queued": 8}, "bandwidth": {"global_bps": 0, "per_host_bps": 0, "per_job_bps": 0}, "scheduling": {"policy": "fifo"}, "work_queue": {"path": "zenith_queue.db", "lease_seconds": 120, "heartbeat_interval": 30, "max_attempts": 3}, "metrics": {"enabled": true, "jsonl_file": "", "prometheus_host": "127.0.0.1", "prometheus_port": 0}},
+                 "ui_text": {"title_manual_mode": ">> ENTER URLS (MAX %d) <<", "title_bulk_mode": ">> BULK MODE <<", "bulk_mode_label": "Bulk Mode (from %s)"}}
+            """)
+
+    def get(self, key, default=None):
+        """Get a value from the nested config dictionary."""
+        keys = key.split('.')
+        value = self.config
+        try:
+            for k in keys:
+                value = value[k]
+            return value
+        except (KeyError, TypeError):
+            return default
+
+    def saved_output_path(self):
+        """Returns the last output path saved by the GUI, or the configured default."""
+        path_file = self.get('general.config_file_name', 'zenith_config.json')
+        try:
+            with open(path_file, "r") as f:
+                path = f.read().strip()
+                if path and os.path.isdir(path): return path
+        except FileNotFoundError:
+            pass
+        return self.get('downloader.default_output_path', 'downloads')
@@ -0,0 +1,141 @@
+# dedupe.py
+
+import hashlib
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # Linux ioctl: make a file share another's extents (btrfs, XFS, bcachefs)
+HASH_CHUNK = 1024 * 1024
+LINK_MODES = {'auto': ('reflink', 'hardlink'), 'reflink': ('reflink',), 'hardlink': ('hardlink',)}
+
+
+def file_digest(path, chunk_size=HASH_CHUNK):
+    """BLAKE2b of a file's content, read in fixed chunks so memory stays flat for any size."""
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def link_file(src, dst, mode='auto', allow_copy=False):
+    """
+    Makes `dst` a copy of `src` that shares its storage: a reflink (copy-on-write, so either
+    file can later change on its own) or else a hard link. With `allow_copy`, falls back to a
+    plain copy. An existing `dst` is replaced atomically. Returns the method used, or None.
+    """
+    methods = LINK_MODES.get(mode, ()) + (('copy',) if allow_copy else ())
+    tmp = f"{dst}.zenith-link"
+    for method in methods:
+        try:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if method == 'reflink':
+                _reflink(src, tmp)
+            elif method == 'hardlink':
+                os.link(src, tmp)
+            else:
+                shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+            return method
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    return None
+
+
+class ContentDeduper:
+    """
+    Stores identical media once, using the download index to find it.
+    Before a transfer: a video whose chosen variant (same extractor id, same formats, same
+    conversion) is already on disk elsewhere, e.g. downloaded under another quality option, into
+    another folder or through another URL, is linked into place instead of downloaded again.
+    After a transfer: a file the same size as an indexed one is hashed (as is the other file, once),
+    and identical content is replaced by a link to the copy already stored. Only files whose
+    size collides are ever hashed, so unique downloads cost nothing extra.
+    """
+    def __init__(self, download_index, link_mode='auto', hash_after_download=True):
+        self.download_index = download_index
+        self.link_mode = link_mode
+        self.hash_after_download = hash_after_download
+        self.reused = 0  # transfers avoided
+        self.linked = 0  # duplicates replaced after download
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_config(cls, config, download_index):
+        """Builds the deduper from the `downloader.dedupe` section; None when disabled."""
+        if not config.get('downloader.dedupe.enabled', True):
+            return None
+        return cls(download_index, link_mode=config.get('downloader.dedupe.link_mode', 'auto'),
+                   hash_after_download=config.get('downloader.dedupe.hash_after_download', True))
+
+    def reuse(self, extractor, video_id, variant, target_stem, tier='', url=None):
+        """
+        Links an indexed copy of the same variant to `target_stem` + its extension and records it.
+        Returns the path now holding the content, or None if the video has to be downloaded.
+        """
+        if self.download_index.contains(extractor, video_id, tier):
+            return None  # Already done for this tier; the download index skips it on its own
+        existing = self.download_index.find_variant(extractor, video_id, variant)
+        if existing is None:
+            return None
+        source = existing['output_path']
+        target = target_stem + os.path.splitext(source)[1]
+        if not (os.path.exists(target) and os.path.samefile(source, target)):
+            if os.path.exists(target):
+                return None  # A different file already has this name; let yt-dlp decide
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            if link_file(source, target, self.link_mode, allow_copy=True) is None:
+                return None
+        self.download_index.record(extractor, video_id, target, size=existing['size'], format_id=variant, url=url,
+                                   tier=tier, content_hash=existing['content_hash'])
+        self.reused += 1
+        self.bytes_saved += existing['size'] or 0
+        return target
+
+    def after_download(self, path):
+        """Replaces a just-downloaded file with a link to identical indexed content; returns that copy or None."""
+        if not self.hash_after_download or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        size, seen = stat.st_size, {(stat.st_dev, stat.st_ino)}
+        candidates = []
+        for record in self.download_index.same_size(size):
+            other = os.stat(record['output_path'])
+            if (other.st_dev, other.st_ino) not in seen:  # Links of one file are one candidate
+                seen.add((other.st_dev, other.st_ino))
+                candidates.append(record)
+        if not candidates:
+            return None
+        content_hash = file_digest(path)
+        self.download_index.set_hash(path, content_hash)
+        for record in candidates:
+            other = record['output_path']
+            if record['content_hash'] is None:
+                record['content_hash'] = file_digest(other)
+                self.download_index.set_hash(other, record['content_hash'])
+            if record['content_hash'] == content_hash and link_file(other, path, self.link_mode):
+                self.linked += 1
+                self.bytes_saved += size
+                return other
+        return None
@@ -0,0 +1,185 @@
+# download_index.py
+
+import json
+import os
+import re
+import sqlite3
+import time
+from threading import Lock
+
+# yt-dlp's "%(title)s [%(id)s].%(ext)s" naming; the id is recoverable from the filename.
+BRACKETED_ID = re.compile(r"\[(?P<id>[\w-]{6,})\]\.\w+$")
+AUDIO_EXTENSIONS = {'.m4a', '.mp3', '.opus', '.ogg', '.flac', '.wav', '.aac'}
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS | {'.mp4', '.mkv', '.webm', '.mov'}
+
+
+def media_tier(path, audio=False):
+    """The bare 'audio' or 'video' tier of a file whose exact quality tier is unknown, going by its extension."""
+    return 'audio' if audio or os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS else 'video'
+
+
+RECORD_COLUMNS = ('extractor', 'video_id', 'tier', 'output_path', 'size', 'format', 'url', 'completed_at', 'content_hash')
+
+
+class DownloadIndex:
+    """
+    Persistent SQLite record of finished downloads, keyed by extractor + video id + quality tier
+    (see formats.FormatPlanner.tier), so the audio of a video is not mistaken for its video.
+    Records whose quality is unknown (older indexes, rebuilds from disk) carry just their media type,
+    'audio' or 'video', and match any tier of that type.
+    The engine consults it before any network extraction so re-runs skip what is already on disk.
+    `format` holds the variant actually downloaded and `content_hash` is filled in by dedupe.ContentDeduper.
+    """
+    def __init__(self, db_path="zenith_index.db"):
+        self.db_path = db_path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(downloads)")]
+            if columns and 'tier' not in columns:
+                self._conn.execute("ALTER TABLE downloads RENAME TO downloads_v1")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    extractor    TEXT NOT NULL,
+                    video_id     TEXT NOT NULL,
+                    tier         TEXT NOT NULL DEFAULT '',
+                    output_path  TEXT NOT NULL,
+                    size         INTEGER,
+                    format       TEXT,
+                    url          TEXT,
+                    completed_at REAL NOT NULL,
+                    content_hash TEXT,
+                    PRIMARY KEY (extractor, video_id, tier)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_size ON downloads (size)")
+            if columns and 'tier' not in columns:
+                # One-time migration: keep every record, attributed to no particular tier.
+                self._conn.execute("""
+                    INSERT INTO downloads (extractor, video_id, output_path, size, format, url, completed_at)
+                    SELECT extractor, video_id, output_path, size, format, url, completed_at FROM downloads_v1""")
+                self._conn.execute("DROP TABLE downloads_v1")
+            # Records from before media types were tracked, attributed by their file's extension.
+            for output_path, in self._conn.execute("SELECT output_path FROM downloads WHERE tier = ''").fetchall():
+                self._conn.execute("UPDATE OR IGNORE downloads SET tier = ? WHERE output_path = ? AND tier = ''",
+                                   (media_tier(output_path), output_path))
+            self._conn.execute("DELETE FROM downloads WHERE tier = ''")
+
+    @staticmethod
+    def _key(extractor, video_id):
+        return extractor.lower(), str(video_id)
+
+    def _select(self, where, params):
+        """Records matching `where`, newest first, dropping (and forgetting) those whose file is gone."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RECORD_COLUMNS)} FROM downloads WHERE {where} ORDER BY completed_at DESC",
+                params).fetchall()
+        records = []
+        for row in rows:
+            record = dict(zip(RECORD_COLUMNS, row))
+            if os.path.exists(record['output_path']):
+                records.append(record)
+            else:
+                with self._lock, self._conn:
+                    self._conn.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ? AND tier = ?",
+                                       (record['extractor'], record['video_id'], record['tier']))
+        return records
+
+    def lookup(self, extractor, video_id, tier=None):
+        """
+        Returns the stored record as a dict, or None if unknown or the file has since been removed.
+        With a tier, only a record of that tier (or a bare one of its media type, e.g. 'video' for 'video-720p') counts.
+        """
+        if not tier:
+            records = self._select("extractor = ? AND video_id = ?", self._key(extractor, video_id))
+        else:
+            records = self._select("extractor = ? AND video_id = ? AND tier IN (?, ?)",
+                                   (*self._key(extractor, video_id), tier, tier.split('-', 1)[0]))
+            records.sort(key=lambda record: record['tier'] != tier)  # an exact tier match first
+        return records[0] if records else None
+
+    def contains(self, extractor, video_id, tier=None):
+        return self.lookup(extractor, video_id, tier) is not None
+
+    def find_variant(self, extractor, video_id, variant):
+        """A record of the same video downloaded as the same variant (formats and conversion), under any tier."""
+        records = self._select("extractor = ? AND video_id = ? AND format = ?", (*self._key(extractor, video_id), variant))
+        return records[0] if records else None
+
+    def same_size(self, size):
+        """Records of files exactly `size` bytes long: the only candidates for identical content."""
+        return self._select("size = ?", (size,))
+
+    def set_hash(self, output_path, content_hash):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE downloads SET content_hash = ? WHERE output_path = ?", (content_hash, output_path))
+
+    def record(self, extractor, video_id, output_path, size=None, format_id=None, url=None, completed_at=None, tier='',
+               content_hash=None):
+        if size is None and os.path.exists(output_path):
+            size = os.path.getsize(output_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO downloads ({', '.join(RECORD_COLUMNS)}) VALUES ({', '.join('?' * len(RECORD_COLUMNS))})",
+                (*self._key(extractor, video_id), tier or media_tier(output_path), output_path, size, format_id, url,
+                 completed_at or time.time(), content_hash))
+
+    def forget(self, extractor, video_id, tier=None):
+        with self._lock, self._conn:
+            if tier is None:
+                self._conn.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ?", self._key(extractor, video_id))
+            else:
+                self._conn.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ? AND tier = ?",
+                                   (*self._key(extractor, video_id), tier))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Rebuilding from disk ---
+    def rebuild(self, output_path, subdirs=("Video", "Audio"), default_extractor="youtube"):
+        """
+        Re-creates index entries by scanning existing download folders, given as (video, audio).
+        Files in the audio folder or with an audio extension are recorded as 'audio', the rest as 'video'.
+        Ids come from a `.info.json` sidecar when present, otherwise from a "[id]" suffix in
+        the filename (attributed to `default_extractor`). Files with neither are counted as skipped.
+        Returns (added, skipped).
+        """
+        added = skipped = 0
+        for position, subdir in enumerate(subdirs):
+            folder = os.path.join(output_path, subdir)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in MEDIA_EXTENSIONS or not os.path.isfile(path):
+                    continue
+                key = self._key_from_sidecar(os.path.join(folder, stem + ".info.json"))
+                if key is None:
+                    match = BRACKETED_ID.search(name)
+                    key = (default_extractor, match.group("id")) if match else None
+                if key is None:
+                    skipped += 1
+                    continue
+                self.record(key[0], key[1], path, completed_at=os.path.getmtime(path),
+                            tier=media_tier(path, audio=position == 1))
+                added += 1
+        return added, skipped
+
+    @staticmethod
+    def _key_from_sidecar(info_path):
+        try:
+            with open(info_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        extractor = info.get('extractor_key') or info.get('extractor')
+        if extractor and info.get('id'):
+            return extractor, info['id']
+        return None
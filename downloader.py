@@ -2,21 +2,71 @@
 
 import os
 import sys
-import yt_dlp
+import json
+import time
+import zlib
+import sqlite3
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from contextlib import contextmanager
 from threading import Lock
 
+from formats import FormatPlanner
+from metrics import pp_phase, timed
+from segmented import segmented_http_fd
+
+# yt_dlp is heavy to import; it is loaded by _import_yt_dlp() when the first job needs it.
+yt_dlp = None
+
 # A lock to prevent multiple threads from writing to the console at the same time
 print_lock = Lock()
+_import_lock = Lock()
+
+
+def _import_yt_dlp():
+    """Imports yt_dlp on first use so that headless startup does not pay for it."""
+    global yt_dlp
+    if yt_dlp is None:
+        with _import_lock:
+            if yt_dlp is None:
+                import yt_dlp
+    return yt_dlp
+
+# Downloads are written here (below the output folder) and moved into place once post-processed.
+STAGING_SUBDIR = ".staging"
+# The id keeps two videos with the same title apart (and lets DownloadIndex.rebuild recover it).
+OUTPUT_TEMPLATE = '%(title)s [%(id)s].%(ext)s'
+
+# Keys of a yt-dlp progress dict that consumers actually read; everything else is dropped.
+PROGRESS_KEYS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'speed', 'eta',
+                 'elapsed', 'filename', 'tmpfilename', 'fragment_index', 'fragment_count', 'postprocessor',
+                 '_percent_str', '_speed_str', '_eta_str')
+PROGRESS_INFO_KEYS = ('id', 'title', 'extractor_key', 'playlist_title', 'playlist_index', 'n_entries')
+
+
+def compact_progress(d):
+    """
+    Returns a small snapshot of a yt-dlp progress dict with the same shape,
+    keeping only the fields the GUI and console use instead of the full info_dict.
+    """
+    snapshot = {k: d[k] for k in PROGRESS_KEYS if k in d}
+    info = d.get('info_dict') or {}
+    snapshot['info_dict'] = {k: info[k] for k in PROGRESS_INFO_KEYS if k in info}
+    return snapshot
+
 
 def ytdlp_progress_hook(d, progress_callback=None):
     """
     Progress hook for yt-dlp that can optionally call a GUI callback.
+    Console output is left to print_progress, usually driven by a progress.ProgressBus.
     """
     if progress_callback:
-        # Pass the entire dictionary to the GUI for rich updates.
-        progress_callback(d)
+        progress_callback(compact_progress(d))
 
-    # We also keep the console print for debugging purposes, but protect it with a lock.
+
+def print_progress(d, extra=''):
+    """Writes one progress snapshot to the console as a single carriage-return line."""
+    # Protect the console with a lock, several workers may be reporting at once.
     with print_lock:
         if d['status'] == 'downloading':
             # Extract download information safely using .get()
@@ -31,7 +81,7 @@ def ytdlp_progress_hook(d, progress_callback=None):
                 playlist_info = f" (Playlist: {info['playlist_index']}/{info['n_entries']})"
 
             # Robustness: Using sys.stdout for better control in threaded environments
-            sys.stdout.write(f"\r[Downloader]{playlist_info} {percent_str} | Speed: {speed_str} | ETA: {eta_str}...")
+            sys.stdout.write(f"\r[Downloader]{playlist_info} {percent_str} | Speed: {speed_str} | ETA: {eta_str}{extra}...")
             sys.stdout.flush()
         
         elif d['status'] == 'finished':
@@ -41,61 +91,680 @@ def ytdlp_progress_hook(d, progress_callback=None):
                 print(f"[Downloader] Finished downloading: {os.path.basename(d.get('filename', 'Unknown File'))}")
 
 
-def download_video(url: str, output_path: str, quality_choice: str, progress_callback=None, video_subdir="Video", audio_subdir="Audio"):
+def build_ydl_opts(output_path: str, quality_choice: str, video_subdir="Video", audio_subdir="Audio",
+                   prefer_progressive=True, keep_native_audio=False):
     """
-    Downloads a single YouTube video or audio using yt-dlp, with selectable quality.
-    Now includes robust error handling and configurable subdirectories.
+    Builds the yt-dlp option set for a quality choice. Per-call state such as
+    progress hooks is deliberately left out so the result can key the session pool.
+    'format' is a formats.FormatPlanner, which pooled sessions consult for every video.
     """
-    hook = lambda d: ytdlp_progress_hook(d, progress_callback)
-    
     # Base options for yt-dlp
     ydl_opts = {
-        'progress_hooks': [hook],
         'quiet': True,
         'no_warnings': True,
+        'noprogress': True, # Progress is reported through ytdlp_progress_hook instead
         'ignoreerrors': True,  # This is key for robust playlist/batch downloads
         'nocheckcertificate': True, # Can help in some network environments
+        'extract_flat': 'in_playlist', # Playlists are listed cheaply; download_video walks the entries itself
+        'continuedl': True, # Resume .part files left behind by an interrupted run
+        # outtmpl is relative to 'home', and so is 'temp', where in-progress and not yet post-processed files live
+        'paths': {'home': output_path, 'temp': STAGING_SUBDIR},
     }
 
-    # --- Dynamically set format based on quality_choice ---
-    if "Audio Only (MP3)" in quality_choice:
-        ydl_opts['format'] = 'bestaudio/best'
+    # --- Formats are planned per video from what it actually offers ---
+    planner = FormatPlanner(quality_choice, prefer_progressive=prefer_progressive, keep_native_audio=keep_native_audio)
+    ydl_opts['format'] = planner
+    if planner.audio_only:
         # Use provided audio subdirectory
-        ydl_opts['outtmpl'] = os.path.join(output_path, audio_subdir, '%(title)s.%(ext)s')
-        # Add post-processor to convert to MP3
-        ydl_opts['postprocessors'] = [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192', # Standard MP3 quality
-        }]
+        ydl_opts['outtmpl'] = os.path.join(audio_subdir, OUTPUT_TEMPLATE)
+        # MP3 conversion, or a lossless copy into an audio container when keep_native_audio is set
+        ydl_opts['postprocessors'] = planner.postprocessors()
     else:
-        # Video format selection logic
-        if '1080p' in quality_choice:
-            format_str = 'bv[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/best'
-        else:
-            height = quality_choice.split('p')
-            format_str = f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4][height<={height}]'
-        
-        ydl_opts['format'] = format_str
         # Use provided video subdirectory
-        ydl_opts['outtmpl'] = os.path.join(output_path, video_subdir, '%(title)s.%(ext)s')
+        ydl_opts['outtmpl'] = os.path.join(video_subdir, OUTPUT_TEMPLATE)
+
+    return ydl_opts
+
+
+def quality_tier(quality_choice, keep_native_audio=False):
+    """The download index tier of a quality option (see formats.FormatPlanner.tier)."""
+    return FormatPlanner(quality_choice, keep_native_audio=keep_native_audio).tier
+
+
+def _tier(ydl):
+    planner = getattr(ydl, 'format_planner', None)
+    return planner.tier if planner is not None else None
+
+
+# --- SESSION POOL ---
+def _make_completion_pp(callback):
+    """Builds a yt-dlp postprocessor that reports each finished file once it is in its final place."""
+    PostProcessor = _import_yt_dlp().postprocessor.PostProcessor
+
+    class _CompletionPP(PostProcessor):
+        def run(self, info):
+            callback(info)
+            return [], info
+
+    return _CompletionPP()
+
+
+_staging_ydl_class = None
+
+
+def _staging_youtube_dl():
+    """
+    A YoutubeDL subclass whose post-processing chain can be handed off instead of run inline,
+    whose format selection is delegated to a formats.FormatPlanner given as 'format', and whose
+    HTTP and fragmented downloads use several connections when a segmented.SegmentTuner is set.
+    """
+    global _staging_ydl_class
+    if _staging_ydl_class is None:
+        class StagingYoutubeDL(_import_yt_dlp().YoutubeDL):
+            defer_postprocessing = None  # callable(filename, info, files_to_move), set per checkout
+            plan_callback = None  # callable(FormatPlan), set per checkout
+            segment_tuner = None  # segmented.SegmentTuner, set per checkout
+            metrics = None  # metrics.JobMetrics, set per checkout
+            dedupe = None  # dedupe.ContentDeduper, set per checkout
+            _duration = None
+
+            def __init__(self, params=None, auto_init=True):
+                planner = (params or {}).get('format')
+                self.format_planner = planner if isinstance(planner, FormatPlanner) else None
+                if self.format_planner is not None:
+                    params = dict(params, format=self._select_planned_formats)
+                super().__init__(params, auto_init)
+
+            def process_video_result(self, info_dict, download=True):
+                # The format selector only sees the format list; remember the duration for cost estimates.
+                self._duration = info_dict.get('duration')
+                return super().process_video_result(info_dict, download)
+
+            def dl(self, name, info, subtitle=False, test=False):
+                with timed(self.metrics, 'transfer'):
+                    return self._dl(name, info, subtitle, test)
+
+            def _dl(self, name, info, subtitle, test):
+                tuner = self.segment_tuner
+                if tuner is None or not tuner.enabled or subtitle or test or name == '-' or not info.get('url'):
+                    return super().dl(name, info, subtitle, test)
+                host = urlparse(info['url']).hostname or ''
+                fd_class = yt_dlp.downloader.get_suitable_downloader(info, self.params)
+                if fd_class is yt_dlp.downloader.HttpFD:
+                    fd = segmented_http_fd(yt_dlp)(self, self.params)
+                    fd.tuner = tuner
+                    for hook in self._progress_hooks:
+                        fd.add_progress_hook(hook)
+                    new_info = self._copy_infodict(info)
+                    if new_info.get('http_headers') is None:
+                        new_info['http_headers'] = self._calc_headers(new_info)
+                    return fd.download(name, new_info, subtitle)
+                if fd_class is not None and issubclass(fd_class, yt_dlp.downloader.fragment.FragmentFD):
+                    # DASH/HLS: fetch fragments concurrently, as many as suit this host.
+                    previous = self.params.get('concurrent_fragment_downloads')
+                    self.params['concurrent_fragment_downloads'] = tuner.fragment_concurrency(host)
+                    try:
+                        return super().dl(name, info, subtitle, test)
+                    finally:
+                        self.params['concurrent_fragment_downloads'] = previous
+                return super().dl(name, info, subtitle, test)
+
+            def _select_planned_formats(self, ctx):
+                plan = self.format_planner.plan(ctx['formats'], self._duration)
+                try:
+                    selected = list(self.build_format_selector(plan.format_spec)(ctx))
+                except SyntaxError:
+                    selected = []  # A format id the spec grammar cannot express
+                if not selected:
+                    plan.kind, plan.format_spec, plan.cpu_seconds = 'fallback', 'bv*+ba/b', None
+                    plan.reason = "planned formats not selectable"
+                    selected = list(self.build_format_selector(plan.format_spec)(ctx))
+                if self.plan_callback is not None:
+                    self.plan_callback(plan)
+                return selected
+
+            def process_info(self, info_dict):
+                # The same variant already on disk (another tier, folder or URL) is linked, not downloaded.
+                if self.dedupe is not None and self.format_planner is not None and info_dict.get('format_id'):
+                    with timed(self.metrics, 'link'):
+                        target = self.dedupe.reuse(
+                            info_dict.get('extractor_key') or info_dict.get('extractor', 'generic'), info_dict['id'],
+                            self.format_planner.variant(info_dict['format_id']),
+                            os.path.splitext(self.prepare_filename(info_dict))[0], self.format_planner.tier,
+                            info_dict.get('webpage_url') or info_dict.get('original_url'))
+                    if target is not None:
+                        with print_lock:
+                            print(f"\n[Downloader] Linked an identical copy already on disk: {os.path.basename(target)}")
+                        return
+                return super().process_info(info_dict)
+
+            def run_pp(self, pp, infodict):
+                with timed(self.metrics, pp_phase(pp)):
+                    return super().run_pp(pp, infodict)
+
+            def report_error(self, message, *args, **kwargs):
+                # Called from within yt-dlp's except blocks, so the exception is still at hand.
+                if self.metrics is not None:
+                    self.metrics.fail(sys.exc_info()[1])
+                return super().report_error(message, *args, **kwargs)
+
+            def post_process(self, filename, info, files_to_move=None):
+                # Merges, fixups and audio extraction all run in this chain; a plain single file has none.
+                if self.defer_postprocessing is None or not (info.get('__postprocessors') or self._pps['post_process']):
+                    return super().post_process(filename, info, files_to_move)
+                self.defer_postprocessing(filename, dict(info), dict(files_to_move or {}))
+                return info
+
+        _staging_ydl_class = StagingYoutubeDL
+    return _staging_ydl_class
+
+
+class _PooledSession:
+    """A long-lived YoutubeDL instance plus the per-call state its hooks dispatch to."""
+    def __init__(self, ydl_opts):
+        self.progress_callback = None
+        self.download_index = None
+        self.cancel_event = None
+        self.bandwidth = None
+        self.ydl = _staging_youtube_dl()(dict(ydl_opts, progress_hooks=[self._on_progress],
+                                              match_filter=self._match_filter))
+        self.ydl.add_post_processor(_make_completion_pp(self._on_complete), when='after_move')
+
+    def _on_progress(self, d):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            # Abort mid-file; the .part file stays on disk and is continued on the next run.
+            raise yt_dlp.utils.DownloadCancelled("Download halted; partial file kept for resume")
+        if self.bandwidth is not None and d.get('status') == 'downloading':
+            # Sleeping here, on the download thread, is what throttles the transfer.
+            nbytes = self.bandwidth.observe(d.get('tmpfilename') or d.get('filename'), d.get('downloaded_bytes'))
+            self.bandwidth.consume(nbytes, self.cancel_event)
+        metrics = self.ydl.metrics
+        if metrics is not None and d.get('status') == 'finished' and d.get('downloaded_bytes') is not None:
+            metrics.add_file(d['downloaded_bytes'])
+        ytdlp_progress_hook(d, self.progress_callback)
+
+    def _match_filter(self, info, incomplete=False):
+        """Skips playlist entries the download index already has, before they are extracted."""
+        if self.download_index is None:
+            return None
+        extractor = info.get('extractor_key') or info.get('ie_key')
+        if extractor and info.get('id') and self.download_index.contains(extractor, info['id'], _tier(self.ydl)):
+            return f"{info['id']} is already in the download index"
+        return None
+
+    def _on_complete(self, info):
+        if self.download_index is None or not info.get('filepath'):
+            return
+        planner, format_id = self.ydl.format_planner, info.get('format_id')
+        self.download_index.record(info.get('extractor_key') or info.get('extractor', 'generic'), info['id'],
+                                   info['filepath'], format_id=planner.variant(format_id) if planner and format_id else format_id,
+                                   url=info.get('webpage_url') or info.get('original_url'), tier=_tier(self.ydl))
+        if self.ydl.dedupe is not None:
+            with timed(self.ydl.metrics, 'dedupe'):
+                duplicate = self.ydl.dedupe.after_download(info['filepath'])
+            if duplicate:
+                with print_lock:
+                    print(f"\n[Downloader] Identical to {os.path.basename(duplicate)}; stored once.")
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+class SessionPool:
+    """
+    Keeps idle YoutubeDL instances keyed by their effective option set, so extractors,
+    the cookie jar and keep-alive HTTP connections survive from one URL to the next.
+    A session is handed to one caller at a time; YoutubeDL itself is not thread-safe.
+    """
+    def __init__(self, max_idle_per_key=8):
+        self.max_idle_per_key = max_idle_per_key
+        self._idle = {}  # options key -> list of _PooledSession
+        self._lock = Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def options_key(ydl_opts):
+        return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+    @contextmanager
+    def session(self, ydl_opts, progress_callback=None, download_index=None, cancel_event=None, bandwidth=None,
+                defer_postprocessing=None, plan_callback=None, segment_tuner=None, metrics=None, dedupe=None):
+        """Checks out a YoutubeDL for `ydl_opts`, creating one if none is idle."""
+        key = self.options_key(ydl_opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+            if session is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if session is None:
+            session = _PooledSession(ydl_opts)
+
+        session.progress_callback = progress_callback
+        session.download_index = download_index
+        session.cancel_event = cancel_event
+        session.bandwidth = bandwidth
+        session.ydl.defer_postprocessing = defer_postprocessing
+        session.ydl.plan_callback = plan_callback
+        session.ydl.segment_tuner = segment_tuner
+        session.ydl.metrics = metrics
+        session.ydl.dedupe = dedupe
+        # YoutubeDL keeps its exit status sticky across download() calls; reset it per checkout.
+        session.ydl._download_retcode = 0
+        healthy = False
+        try:
+            yield session.ydl
+            healthy = True
+        finally:
+            session.progress_callback = None
+            session.download_index = None
+            session.cancel_event = None
+            session.bandwidth = None
+            session.ydl.defer_postprocessing = None
+            session.ydl.plan_callback = None
+            session.ydl.segment_tuner = None
+            session.ydl.metrics = None
+            session.ydl.dedupe = None
+            self._checkin(key, session, healthy)
+
+    def _checkin(self, key, session, healthy):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if healthy and len(idle) < self.max_idle_per_key:
+                idle.append(session)
+                return
+        session.close()
+
+    def close(self):
+        """Closes every idle session. Sessions currently checked out are closed on return."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle = {}
+            self.max_idle_per_key = 0
+        for session in sessions:
+            session.close()
+
+
+default_session_pool = SessionPool()
+
+
+# --- PRE-NETWORK ID RESOLUTION ---
+_extractor_lock = Lock()
+_extractor_classes = None
+
+
+def _suitable_extractor(url):
+    """Returns the (non-generic) extractor class whose URL pattern matches, or None."""
+    global _extractor_classes
+    with _extractor_lock:
+        if _extractor_classes is None:
+            _extractor_classes = [ie for ie in _import_yt_dlp().extractor.gen_extractor_classes()
+                                  if ie.ie_key() != 'Generic']
+        candidates = list(_extractor_classes)
+    for i, ie in enumerate(candidates):
+        if not ie.suitable(url):
+            continue
+        if i:
+            # Move the hit to the front; bulk lists are usually dominated by one site.
+            with _extractor_lock:
+                _extractor_classes.remove(ie)
+                _extractor_classes.insert(0, ie)
+        return ie
+    return None
+
+
+def resolve_video_key(url):
+    """
+    Returns (extractor_key, video_id) for a URL using only extractor URL patterns, without any
+    network access, or None when the id cannot be known before extraction (e.g. generic pages).
+    """
+    ie = _suitable_extractor(url)
+    if ie is None:
+        return None
+    try:
+        video_id = ie.get_temp_id(url)
+    except Exception:
+        video_id = None
+    return (ie.ie_key(), video_id) if video_id else None
+
+
+def is_single_video(url):
+    """True if the URL's extractor only ever returns one video, None when that is not known up front."""
+    ie = _suitable_extractor(url)
+    return ie.is_single_video(url) if ie is not None else None
+
+
+# --- METADATA CACHE ---
+class MetadataCache:
+    """
+    Caches raw extract_info results: flat playlist listings and per-video format lists.
+    Recently used entries live in a size-bounded in-memory LRU; all entries are backed by
+    an SQLite store so the cache survives restarts. A video entry is stale once its TTL
+    passes or any of its signed format URLs expires, whichever comes first.
+    """
+    # Bulky fields that downloading never reads; dropping them keeps entries small.
+    STRIP_KEYS = ('automatic_captions', 'subtitles', 'heatmap', 'thumbnails', 'description')
+    EXPIRY_MARGIN = 300  # seconds of head-room left on signed format URLs
+
+    def __init__(self, db_path=None, max_entries=2048, max_disk_entries=100000, video_ttl=6 * 3600, playlist_ttl=1800):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.video_ttl = video_ttl
+        self.playlist_ttl = playlist_ttl
+        self._memory = OrderedDict()  # key -> (expires_at, JSON text); callers get a fresh copy, yt-dlp mutates infos
+        self._lock = Lock()
+        self._conn = None
+        self._puts_since_prune = 0
+        self.hits = self.misses = self.expired = 0
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS metadata (
+                        key         TEXT PRIMARY KEY,
+                        expires_at  REAL NOT NULL,
+                        last_access REAL NOT NULL,
+                        payload     BLOB NOT NULL
+                    )""")
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the cache from the `downloader.metadata_cache` section of a ConfigManager."""
+        return cls(db_path=config.get('downloader.metadata_cache.path', 'zenith_metadata.db'),
+                   max_entries=config.get('downloader.metadata_cache.max_entries', 2048),
+                   max_disk_entries=config.get('downloader.metadata_cache.max_disk_entries', 100000),
+                   video_ttl=config.get('downloader.metadata_cache.video_ttl', 6 * 3600),
+                   playlist_ttl=config.get('downloader.metadata_cache.playlist_ttl', 1800))
+
+    @staticmethod
+    def key_for(url):
+        """Caches by extractor + id where the URL reveals it, so URL variants share one entry."""
+        key = resolve_video_key(url)
+        return f"{key[0]}:{key[1]}" if key else url
+
+    def _expires_at(self, info):
+        now = time.time()
+        if info.get('_type') in ('playlist', 'multi_video'):
+            return now + self.playlist_ttl
+        expires_at = now + self.video_ttl
+        for fmt in info.get('formats') or []:
+            expire = parse_qs(urlparse(fmt.get('url') or '').query).get('expire')
+            if expire and expire[0].isdigit():
+                expires_at = min(expires_at, int(expire[0]) - self.EXPIRY_MARGIN)
+        return expires_at
+
+    def get(self, url):
+        key = self.key_for(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[1])
+                del self._memory[key]
+                self.expired += 1
+            if self._conn is not None:
+                row = self._conn.execute("SELECT expires_at, payload FROM metadata WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    text = zlib.decompress(row[1]).decode('utf-8')
+                    with self._conn:
+                        self._conn.execute("UPDATE metadata SET last_access = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], text)
+                    self.hits += 1
+                    return json.loads(text)
+                if row is not None:
+                    self.expired += 1
+            self.misses += 1
+        return None
+
+    def peek(self, url):
+        """Like get(), for estimates rather than extraction: hit/miss counts and LRU order are left alone."""
+        key = self.key_for(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                return json.loads(entry[1])
+            if self._conn is not None:
+                row = self._conn.execute("SELECT expires_at, payload FROM metadata WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    return json.loads(zlib.decompress(row[1]).decode('utf-8'))
+        return None
+
+    def put(self, url, info):
+        """Stores a JSON-safe (YoutubeDL.sanitize_info) extraction result."""
+        info = {k: v for k, v in info.items() if k not in self.STRIP_KEYS}
+        expires_at = self._expires_at(info)
+        if expires_at <= time.time():
+            return
+        key = self.key_for(url)
+        text = json.dumps(info)
+        with self._lock:
+            self._remember(key, expires_at, text)
+            if self._conn is not None:
+                payload = zlib.compress(text.encode('utf-8'))
+                with self._conn:
+                    self._conn.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                                       (key, expires_at, time.time(), payload))
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= 256:
+                    self._prune_disk()
+
+    def invalidate(self, url):
+        key = self.key_for(url)
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+
+    def _remember(self, key, expires_at, text):
+        self._memory[key] = (expires_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        """Drops expired rows, then the least recently used rows beyond max_disk_entries."""
+        self._puts_since_prune = 0
+        with self._conn:
+            self._conn.execute("DELETE FROM metadata WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute("""
+                DELETE FROM metadata WHERE key IN (
+                    SELECT key FROM metadata ORDER BY last_access DESC LIMIT -1 OFFSET ?)""",
+                (self.max_disk_entries,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _extract(ydl, url, metadata_cache, ie_key=None):
+    """Raw (unprocessed) extraction of a URL, served from the metadata cache when fresh."""
+    info = metadata_cache.get(url) if metadata_cache is not None else None
+    if info is not None:
+        return info
+    info = ydl.extract_info(url, download=False, process=False, ie_key=ie_key)
+    if info is None:
+        return None  # ignoreerrors: yt-dlp already reported the failure
+    entries = info.get('entries')
+    if entries is not None and not isinstance(entries, list):
+        # Materialize lazy playlist pages so the listing can be cached and counted.
+        info['entries'] = entries.getslice() if hasattr(entries, 'getslice') else list(entries)
+    info = ydl.sanitize_info(info)
+    if metadata_cache is not None:
+        metadata_cache.put(url, info)
+    return info
+
+
+def _playlist_extra_info(info, n_entries):
+    """The playlist fields yt-dlp would add to each entry's info dict (for templates and progress)."""
+    return {
+        'playlist': info.get('title') or info.get('id'),
+        'playlist_title': info.get('title'),
+        'playlist_id': info.get('id'),
+        'n_entries': n_entries,
+    }
+
+
+def _is_indexed(entry, download_index, tier=None):
+    extractor = entry.get('ie_key') or entry.get('extractor_key')
+    return (download_index is not None and extractor and entry.get('id')
+            and download_index.contains(extractor, entry['id'], tier))
+
+
+# Listing a playlist only needs a flat extraction; no formats, output template or hooks.
+FLAT_EXTRACT_OPTS = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'ignoreerrors': True,
+                     'nocheckcertificate': True, 'extract_flat': 'in_playlist'}
+
+
+def expand_playlist(url, metadata_cache=None, download_index=None, session_pool=None, tier=None):
+    """
+    Lists a playlist with one flat extraction so each entry can be scheduled as its own job.
+    Returns a list of (entry_url, extra_info) pairs, skipping entries already in the download
+    index (for `tier`, see quality_tier), or None if the URL is a single video or a playlist whose entries cannot be fetched
+    on their own (those are downloaded as one unit by download_video).
+    """
+    _import_yt_dlp()
+    if is_single_video(url):
+        return None  # Known from the URL pattern alone; no network needed
+    pool = session_pool or default_session_pool
+    with pool.session(FLAT_EXTRACT_OPTS) as ydl:
+        info = _extract(ydl, url, metadata_cache)
+    if info is None or info.get('_type') not in ('playlist', 'multi_video'):
+        return None
+    entries = [e for e in info.get('entries') or [] if e]
+    if not all(e.get('_type') in ('url', 'url_transparent') and e.get('url') for e in entries):
+        return None
+    playlist_info = _playlist_extra_info(info, len(entries))
+    expanded = []
+    for index, entry in enumerate(entries, 1):
+        if _is_indexed(entry, download_index, tier):
+            continue
+        extra_info = dict(playlist_info, playlist_index=index)
+        if entry.get('duration'):
+            extra_info['duration'] = entry['duration']  # lets the scheduler size the entry before extraction
+        expanded.append((entry['url'], extra_info))
+    return expanded
+
+
+def _process_url(ydl, url, metadata_cache=None, download_index=None, extra_info=None, cancel_event=None, ie_key=None):
+    """
+    Extracts (or recalls) a URL and downloads it; playlists are walked entry by entry.
+    A 'url' result is followed with the extractor it names. A 'url_transparent' one is left to
+    yt-dlp, which lays its fields (title, id...) over what the target extracts to.
+    extra_info (e.g. the playlist fields of an entry scheduled on its own) is merged into the info dict.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise yt_dlp.utils.DownloadCancelled("Download halted before the next item")
+    info = _extract(ydl, url, metadata_cache, ie_key)
+    if info is None:
+        return
+    result_type = info.get('_type', 'video')
+    if result_type == 'url':
+        _process_url(ydl, info['url'], metadata_cache, download_index, extra_info, cancel_event, info.get('ie_key'))
+        return
+    if result_type in ('playlist', 'multi_video'):
+        entries = [e for e in info.get('entries') or [] if e]
+        playlist_info = _playlist_extra_info(info, len(entries))
+        for index, entry in enumerate(entries, 1):
+            entry_extra = dict(playlist_info, playlist_index=index)
+            if _is_indexed(entry, download_index, _tier(ydl)):
+                continue
+            if entry.get('_type', 'video') == 'url':
+                _process_url(ydl, entry['url'], metadata_cache, download_index, entry_extra, cancel_event,
+                             entry.get('ie_key'))
+            else:
+                ydl.process_ie_result(entry, download=True, extra_info=entry_extra)
+        return
+    ydl.process_ie_result(info, download=True, extra_info=extra_info or {})
+
+
+def download_video(url: str, output_path: str, quality_choice: str, progress_callback=None,
+                   video_subdir="Video", audio_subdir="Audio", prefer_progressive=True, keep_native_audio=False,
+                   session_pool=None, download_index=None, metadata_cache=None, segment_tuner=None, dedupe=None,
+                   cancel_event=None, bandwidth=None, postprocess=None, metrics=None, plan_callback=None,
+                   extra_info=None):
+    """
+    Downloads a single YouTube video or audio using yt-dlp, with selectable quality.
+    Returns True if yt-dlp reported success (or the item was already downloaded), False otherwise.
+    """
+    _import_yt_dlp()
+    ydl_opts = build_ydl_opts(output_path, quality_choice, video_subdir, audio_subdir, prefer_progressive, keep_native_audio)
+    if download_index is not None:
+        # Skipped before any network extraction when this tier of the item is already on disk.
+        key = resolve_video_key(url)
+        existing = download_index.lookup(*key, tier=ydl_opts['format'].tier) if key else None
+        if existing:
+            with print_lock:
+                print(f"\n[Downloader] Already downloaded, skipping: {os.path.basename(existing['output_path'])}")
+            return True
+
+    if bandwidth is not None:
+        # A bandwidth.Transfer paces the download against the shared budget. Small fixed reads keep throttling smooth; yt-dlp otherwise grows blocks up to 4 MiB.
+        ydl_opts.update(buffersize=256 * 1024, noresizebuffer=True)
+    pool = session_pool or default_session_pool
+
+    def defer(filename, info, files_to_move):
+        """
+        Hands a downloaded video's merging and transcoding to the `postprocess` stage (a callable that
+        returns False if it did not queue the task); the streams wait in staging until the task runs.
+        """
+        deferred_at = time.perf_counter()
+        def task():
+            if metrics is not None:
+                metrics.add('stage_wait', time.perf_counter() - deferred_at)
+            with pool.session(ydl_opts, download_index=download_index, metrics=metrics, dedupe=dedupe) as stage_ydl:
+                # Postprocessors created for this download must report to the stage's session.
+                for pp in info.get('__postprocessors') or []:
+                    pp.set_downloader(stage_ydl)
+                stage_ydl.post_process(filename, info, files_to_move)
+                return stage_ydl._download_retcode == 0
+        if not postprocess(task):
+            raise yt_dlp.utils.DownloadCancelled("Download halted before post-processing; streams kept in staging")
 
     # --- Execute Download with improved error handling ---
     try:
         # Create output directory if it doesn't exist
-        os.makedirs(os.path.dirname(ydl_opts['outtmpl']), exist_ok=True)
+        os.makedirs(os.path.join(output_path, os.path.dirname(ydl_opts['outtmpl'])), exist_ok=True)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            error_code = ydl.download([url])
+        with pool.session(ydl_opts, progress_callback, download_index, cancel_event, bandwidth,
+                          defer if postprocess is not None else None, plan_callback, segment_tuner, metrics, dedupe) as ydl:
+            # Extraction and format selection; transfers and postprocessors time themselves.
+            with timed(metrics, 'extract'):
+                _process_url(ydl, url, metadata_cache, download_index, extra_info, cancel_event)
+            error_code = ydl._download_retcode
             if error_code != 0:
                 with print_lock:
                     print(f"\n[Downloader] WARNING: yt-dlp returned a non-zero exit code ({error_code}) for {url}. It might have been skipped.")
+            return error_code == 0
 
+    except yt_dlp.utils.DownloadCancelled as e:
+        # cancel_event was set: the .part file is kept and resumed by a later run.
+        with print_lock:
+            print(f"\n[Downloader] HALTED: {url}. {e}")
+        return False
     except yt_dlp.utils.DownloadError as e:
         # This handles network errors, video unavailability, etc.
+        if metrics is not None:
+            metrics.fail(e)
         with print_lock:
             print(f"\n[Downloader] DOWNLOAD_ERROR: Could not download {url}. Reason: {e}")
+        return False
     except Exception as e:
         # This handles unexpected errors in the downloader setup or execution
+        if metrics is not None:
+            metrics.fail(e)
         with print_lock:
-            print(f"\n[Downloader] UNEXPECTED_ERROR: An issue occurred with {url}. Reason: {e}")
\ No newline at end of file
+            print(f"\n[Downloader] UNEXPECTED_ERROR: An issue occurred with {url}. Reason: {e}")
+        return False
@@ -0,0 +1,439 @@
+# engine.py
+
+import heapq
+import threading
+from collections import deque
+from contextlib import nullcontext
+from urllib.parse import urlparse
+
+import downloader
+from metrics import JobMetrics
+from scheduling import JobScheduler
+
+# Per-job options that steer scheduling and bandwidth rather than download_video.
+SCHEDULING_HINTS = ('weight', 'priority', 'deadline')
+
+
+def host_key(url):
+    """Returns the host a URL points at, used to group jobs for per-host caps."""
+    host = (urlparse(url).hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+class DownloadJob:
+    """A single target URL tracked by the engine."""
+    def __init__(self, job_id, url, options=None, journal_id=None):
+        self.job_id = job_id
+        self.url = url
+        self.options = options or {}  # per-job overrides of the engine's download_options
+        self.journal_id = journal_id
+        self.host = host_key(url)
+        self.status = "queued"
+        self.error = None
+        self.attempts = 0
+        self.parent = None  # job_id of the playlist job this entry was expanded from
+        self.children = 0  # entries queued, when this job was a playlist
+        self.deferred = 0  # post-processing tasks still waiting on the stage
+        self.deferred_status = None  # "failed" or "stopped" once a stage task did not succeed
+        self.plans = []  # formats.FormatPlan per video of the latest attempt
+        self.metrics = JobMetrics(job_id, url)  # phase timings, bytes and errors across all attempts
+        self.priority = self.options.get('priority', 0)  # higher runs first, from a links-file tag
+        self.deadline = self.options.get('deadline')  # epoch seconds, from a links-file tag
+        self.estimate = None  # expected bytes, see scheduling.JobScheduler.estimate
+        self.progress_bytes = 0  # bytes of the current file so far
+        self.seq = 0  # queuing order, the tie-breaker of every policy
+
+
+class DownloadEngine:
+    """
+    Runs downloader.download_video across a pool of worker threads.
+    Jobs are handed out round-robin across hosts so that no single host holds more
+    than `per_host_limit` transfers at once, and a slow host cannot block the others.
+    """
+    def __init__(self, download_options, max_workers=4, per_host_limit=3, stop_event=None,
+                 progress_callback=None, job_callback=None, max_pending=1000, journal=None, abort_on_stop=False, bandwidth=None,
+                 expand_playlists=True, max_retries=2, postprocess_stage=None, metrics=None, scheduler=None,
+                 entry_sink=None):
+        self.download_options = download_options  # kwargs forwarded to download_video
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.stop_event = stop_event or threading.Event()
+        self.progress_callback = progress_callback  # called as (job, progress_dict)
+        self.job_callback = job_callback  # called as (job) on every status change
+        self.max_pending = max(1, int(max_pending))  # submit() blocks beyond this, bounding memory for streamed input
+        self.journal = journal  # state changes are logged before they happen; start() re-queues incomplete jobs
+        self.abort_on_stop = abort_on_stop  # stop mid-file (resumable via the journal) instead of letting transfers finish
+        self.bandwidth = bandwidth  # a bandwidth.BandwidthScheduler every active job registers a transfer with
+        self.expand_playlists = expand_playlists  # flat-extract playlists and queue each entry as a job of its own
+        self.max_retries = max(0, int(max_retries))  # extra attempts for a failed job, queued behind the others
+        # A postprocess.PostProcessStage: a worker moves on once its download is on disk, and the job
+        # completes when its merge/transcode tasks do. A failed task fails the job for good, without retries.
+        self.postprocess_stage = postprocess_stage
+        self.metrics = metrics  # a metrics.MetricsRegistry recording every job that reaches a final status
+        self.scheduler = scheduler or JobScheduler()  # picks the next queued job and estimates eta()
+        # Takes a playlist's entries instead of this engine's queue, e.g. for workqueue.QueueWorker;
+        # called as (job, [(url, options), ...]), returns how many were queued.
+        self.entry_sink = entry_sink
+
+        self._cond = threading.Condition()
+        self._pending = {}  # host -> heap of (scheduler key, seq, DownloadJob)
+        self._host_order = deque()  # round-robin order of hosts with pending jobs
+        self._seq = 0
+        self._active_per_host = {}
+        self._workers = []
+        self._closed = False
+        self._next_id = 0
+        self._pending_count = 0
+        self._inflight_urls = set()  # pending or active, so a URL is never downloaded twice at once
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.resumed = 0
+        self.expanded = 0  # playlist jobs replaced by their entries
+        self.retried = 0
+        self.postprocessing = 0  # downloaded jobs waiting on the post-processing stage
+        if metrics is not None:
+            metrics.gauge('zenith_engine_active_jobs', 'Jobs being extracted or downloaded.', lambda: self.active)
+            metrics.gauge('zenith_engine_pending_jobs', 'Jobs waiting for a worker.', lambda: self._pending_count)
+            metrics.gauge('zenith_engine_postprocessing_jobs', 'Downloaded jobs waiting on post-processing.',
+                          lambda: self.postprocessing)
+
+    # --- Lifecycle ---
+    def start(self):
+        if self.journal is not None:
+            for entry in self.journal.incomplete():
+                if self._enqueue(entry.url, entry.options, entry.job_id):
+                    self.resumed += 1
+        for n in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"zenith-worker-{n}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def submit(self, url, options=None):
+        """
+        Queues a URL and returns its DownloadJob, waiting while the queue is full.
+        Returns None if the same URL is already pending or in flight.
+        """
+        with self._cond:
+            while self._pending_count >= self.max_pending and not self.stop_event.is_set():
+                self._cond.wait(0.5)
+        return self._enqueue(url, options)
+
+    def _enqueue(self, url, options=None, journal_id=None, internal=False):
+        # Estimated before taking the lock: it may read the metadata cache from disk.
+        estimate = self.scheduler.estimate(url, dict(self.download_options, **(options or {})))
+        with self._cond:
+            if self._closed and not internal:
+                raise RuntimeError("Engine is closed to new submissions.")
+            if url in self._inflight_urls:
+                return None
+            if self.journal is not None and journal_id is None:
+                journal_id = self.journal.begin(url, dict(self.download_options, **(options or {})))
+            self._next_id += 1
+            job = DownloadJob(self._next_id, url, options, journal_id)
+            job.estimate = estimate
+            self._push(job)
+            self._inflight_urls.add(url)
+            self.submitted += 1
+        return job
+
+    def _push(self, job):
+        """Queues a job on its host's heap, behind jobs of equal rank already queued; caller holds the lock."""
+        if job.host not in self._pending:
+            self._pending[job.host] = []
+            self._host_order.append(job.host)
+        self._seq += 1
+        job.seq = self._seq
+        heapq.heappush(self._pending[job.host], (self.scheduler.key(job), job.seq, job))
+        self._pending_count += 1
+        self.scheduler.queued(job)
+        job.metrics.queued()
+        self._cond.notify_all()
+
+    def close(self):
+        """Signals that no more jobs will be submitted; workers exit once the queue drains."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stop(self):
+        """Stops handing out new jobs. Transfers already in flight are allowed to finish."""
+        self.stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def join(self):
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        with self._cond:
+            while self.postprocessing:
+                self._cond.wait(0.5)
+
+    def run(self, urls):
+        """
+        Convenience wrapper: process an iterable of URLs, or (url, options) pairs such as tagged
+        links-file lines, and block until done or stopped.
+        """
+        self.start()
+        try:
+            # Check for a stop before pulling each URL, so a streaming source is not
+            # advanced past a URL that then never gets submitted.
+            urls = iter(urls)
+            while not self.stop_event.is_set():
+                item = next(urls, None)
+                if item is None:
+                    break
+                if isinstance(item, tuple):
+                    self.submit(*item)
+                else:
+                    self.submit(item)
+        finally:
+            self.close()
+            self.join()
+        return self
+
+    @property
+    def pending(self):
+        return self._pending_count
+
+    def eta(self):
+        """Seconds until the queue drains at the throughput observed so far, or None before any is."""
+        with self._cond:
+            return self.scheduler.eta()
+
+    @property
+    def targets(self):
+        """Jobs submitted, counting each playlist as its entries rather than as a job of its own."""
+        return self.submitted - self.expanded
+
+    # --- Scheduling ---
+    def _take_job(self):
+        """Blocks until a job whose host has spare capacity is available, or the engine drains."""
+        with self._cond:
+            while True:
+                if self.stop_event.is_set():
+                    return None
+                host = self._next_host()
+                if host is not None:
+                    queue = self._pending[host]
+                    job = heapq.heappop(queue)[2]
+                    self._pending_count -= 1
+                    self.scheduler.taken(job)
+                    job.metrics.dequeued()
+                    self._cond.notify_all()  # wake a submit() blocked on a full queue
+                    if not queue:
+                        del self._pending[host]
+                        self._host_order.remove(host)
+                    self._active_per_host[host] = self._active_per_host.get(host, 0) + 1
+                    self.active += 1
+                    return job
+                # Active jobs may still expand into entries or be retried, so idle workers wait for them.
+                if self._closed and not self._pending and not self.active:
+                    return None
+                # Wake periodically so a stop_event set from outside is noticed promptly.
+                self._cond.wait(0.5)
+
+    def _next_host(self):
+        """The host to take the next job from, among those with spare capacity; caller holds the lock."""
+        if self.scheduler.round_robin:
+            for _ in range(len(self._host_order)):
+                host = self._host_order[0]
+                self._host_order.rotate(-1)
+                if self._active_per_host.get(host, 0) < self.per_host_limit:
+                    return host
+            return None
+        # Otherwise the best-ranked job across hosts: compare each host's head.
+        eligible = [host for host in self._host_order if self._active_per_host.get(host, 0) < self.per_host_limit]
+        return min(eligible, key=lambda host: self._pending[host][0][:2], default=None)
+
+    def _release_job(self, job):
+        """
+        Settles a job its worker is done with: hands it to the post-processing stage, queues a
+        retry or counts its final status. Deciding and counting in one critical section means a
+        stage task finishing meanwhile finds the job either still with its worker or handed over.
+        """
+        with self._cond:
+            if job.status == "done" and job.deferred:
+                job.status = "post-processing"
+            elif job.status == "done" and job.deferred_status:
+                job.status = job.deferred_status  # A stage task already failed or was halted
+            elif job.status == "failed" and job.attempts <= self.max_retries and not self.stop_event.is_set():
+                job.status = "retrying"
+            self.scheduler.released(job)
+            self._active_per_host[job.host] -= 1
+            if not self._active_per_host[job.host]:
+                del self._active_per_host[job.host]
+            self.active -= 1
+            if job.status == "retrying":
+                self.retried += 1
+                self._journal(job, "queued")  # Before another worker can take it up again
+                self._push(job)  # Behind everything already queued for its host; the URL stays in flight
+            elif job.status == "post-processing":
+                self.postprocessing += 1  # Frees the worker; the URL stays in flight until the stage is done
+            else:
+                self._inflight_urls.discard(job.url)
+                if job.status == "done":
+                    self.completed += 1
+                elif job.status == "failed":
+                    self.failed += 1
+                elif job.status == "expanded":
+                    self.expanded += 1
+            self._cond.notify_all()
+        if job.status in ("done", "failed", "expanded"):
+            # An expanded playlist is done once its entries are journaled as jobs of their own.
+            self._journal(job, "failed" if job.status == "failed" else "done")
+
+    def _worker_loop(self):
+        while True:
+            job = self._take_job()
+            if job is None:
+                return
+            with self._cond:
+                job.status = "downloading"
+                job.attempts += 1
+                # Stage tasks of an earlier attempt no longer count; see _deferred_done.
+                job.deferred = 0
+                job.deferred_status = None
+            self._journal(job, "extracting")
+            self._notify(job)
+            try:
+                options = dict(self.download_options, **job.options)
+                if self.expand_playlists and self._expand(job, options):
+                    job.status = "expanded"
+                else:
+                    job.status = self._download(job, options)
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+                job.metrics.fail(e)
+            finally:
+                self._release_job(job)
+                if job.status not in ("retrying", "post-processing"):
+                    self._record(job)
+                self._notify(job)
+
+    def _expand(self, job, options):
+        """Queues each entry of a playlist URL as its own job; returns False for anything else."""
+        if 'metadata_cache' not in options or options['metadata_cache'] is None:
+            # A throwaway cache lets a non-playlist URL's extraction be reused by its download.
+            options['metadata_cache'] = downloader.MetadataCache(max_entries=4)
+        with job.metrics.phase('expand'):
+            entries = downloader.expand_playlist(job.url, metadata_cache=options['metadata_cache'],
+                                                 download_index=options.get('download_index'),
+                                                 session_pool=options.get('session_pool'),
+                                                 tier=downloader.quality_tier(options.get('quality_choice', ''),
+                                                                              options.get('keep_native_audio', False)))
+        if entries is None:
+            return False
+        entry_options = {k: v for k, v in job.options.items() if k != 'extra_info'}
+        if self.entry_sink is not None:
+            job.children = self.entry_sink(job, [(url, dict(entry_options, extra_info=extra_info))
+                                                 for url, extra_info in entries])
+            return True
+        for url, extra_info in entries:
+            # Not subject to max_pending: a worker blocking on the queue it feeds could stall the pool.
+            child = self._enqueue(url, dict(entry_options, extra_info=extra_info), internal=True)
+            if child is not None:
+                child.parent = job.job_id
+                job.children += 1
+        return True
+
+    def _download(self, job, options):
+        """Runs download_video for a job and returns its resulting status."""
+        weight = options.pop('weight', 1.0)
+        for hint in SCHEDULING_HINTS:
+            options.pop(hint, None)  # not download_video arguments
+        if self.abort_on_stop:
+            options['cancel_event'] = self.stop_event
+        callback = lambda d, job=job: self._on_progress(job, d)
+        job.plans = []
+        options['plan_callback'] = job.plans.append
+        options['metrics'] = job.metrics
+        errors = len(job.metrics.errors)
+        transfer = (self.bandwidth.transfer(job.job_id, job.host, weight=weight)
+                    if self.bandwidth is not None else nullcontext())
+        if self.postprocess_stage is not None:
+            options['postprocess'] = lambda task, job=job: self._defer(job, task)
+        with transfer as handle:
+            if handle is not None:
+                options['bandwidth'] = handle
+            ok = downloader.download_video(job.url, progress_callback=callback, **options)
+        if not ok and self.abort_on_stop and self.stop_event.is_set():
+            return "stopped"  # left incomplete in the journal, resumed next start
+        if not ok and len(job.metrics.errors) == errors:
+            job.metrics.fail()  # yt-dlp gave up without reporting an error of its own
+        return "done" if ok else "failed"
+
+    # --- Post-processing stage ---
+    def _defer(self, job, task):
+        """Queues a job's merge/transcode on the stage; blocks while the stage is saturated."""
+        def run():
+            if self.abort_on_stop and self.stop_event.is_set():
+                return None  # Halted: the streams stay in staging and the journal resumes the job
+            return task()
+        with self._cond:
+            job.deferred += 1
+            attempt = job.attempts
+        queued = self.postprocess_stage.submit(run, lambda result: self._deferred_done(job, attempt, result),
+                                               cancel_event=self.stop_event if self.abort_on_stop else None)
+        if not queued:
+            with self._cond:
+                if job.attempts == attempt:
+                    job.deferred -= 1
+        return queued
+
+    def _deferred_done(self, job, attempt, result):
+        with self._cond:
+            if job.attempts != attempt:
+                return  # Left over from an attempt that failed; the retry redoes its work
+            job.deferred -= 1
+            if result is None:
+                job.deferred_status = "stopped"
+            elif not result and job.deferred_status is None:
+                job.deferred_status = "failed"
+            if job.deferred or job.status != "post-processing":
+                return  # More tasks pending, or the worker has not handed the job over yet
+            job.status = job.deferred_status or "done"
+            self.postprocessing -= 1
+            self._inflight_urls.discard(job.url)
+            if job.status == "done":
+                self.completed += 1
+            elif job.status == "failed":
+                self.failed += 1
+            self._cond.notify_all()
+        if job.status in ("done", "failed"):
+            self._journal(job, job.status)
+        self._record(job)
+        self._notify(job)
+
+    def _on_progress(self, job, d):
+        status = d.get('status')
+        if status == 'downloading':
+            job.progress_bytes = d.get('downloaded_bytes') or 0
+            self._journal(job, "downloading", d.get('tmpfilename'))
+        elif status == 'finished' and d.get('postprocessor') is None:
+            self._journal(job, "post-processing")
+        if self.progress_callback:
+            self.progress_callback(job, d)
+
+    def _record(self, job):
+        if self.metrics is not None:
+            self.metrics.record(job.metrics, status=job.status, host=job.host, parent=job.parent,
+                                attempts=job.attempts, plans=[plan.to_dict() for plan in job.plans])
+
+    def _journal(self, job, state, partial=None):
+        if self.journal is not None and job.journal_id is not None:
+            self.journal.transition(job.journal_id, state, partial)
+
+    def _notify(self, job):
+        if self.job_callback:
+            try:
+                self.job_callback(job)
+            except Exception as e:
+                print(f"[Engine] job_callback failed for {job.url}: {e}")
@@ -0,0 +1,209 @@
+# formats.py
+
+import re
+
+QUALITY_HEIGHT = re.compile(r'(\d+)p')
+
+# Rough single-core throughput of the ffmpeg work a plan implies, used to estimate its CPU cost.
+REMUX_BYTES_PER_SECOND = 200 * 1024 * 1024  # stream copy is bound by disk I/O, not the codec
+MP3_ENCODE_SPEED = 60.0  # seconds of audio libmp3lame encodes per CPU second
+
+# Audio codecs that can be stored as-is in a common audio container (stream copy, no re-encode).
+NATIVE_AUDIO_CODECS = ('mp4a', 'aac', 'opus', 'vorbis', 'mp3', 'flac')
+MP4_VIDEO_CODECS = ('avc1', 'h264', 'av01', 'hev1', 'hvc1', 'h265')
+# The file extension a stream-copied audio codec ends up with (mirrors FFmpegExtractAudio).
+AUDIO_COPY_EXTS = {'mp4a': 'm4a', 'aac': 'm4a', 'opus': 'opus', 'vorbis': 'ogg', 'mp3': 'mp3', 'flac': 'flac'}
+
+
+def target_height(quality_choice):
+    """The height cap in a quality option such as '720p'; None (uncapped) for '1080p (Best Video)' and for audio."""
+    match = QUALITY_HEIGHT.search(quality_choice)
+    uncapped = any(word in quality_choice.lower() for word in ('audio', 'best'))
+    return int(match.group(1)) if match and not uncapped else None
+
+
+def _has_video(fmt):
+    return fmt.get('vcodec') != 'none'  # None means unknown, which yt-dlp treats as present
+
+
+def _has_audio(fmt):
+    return fmt.get('acodec') != 'none'
+
+
+def _codec(fmt, key):
+    return (fmt.get(key) or '').split('.')[0].lower()
+
+
+def _size(fmt, duration):
+    """Best guess at a format's size in bytes, or None."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and duration and fmt.get('tbr'):
+        size = fmt['tbr'] * 1000 / 8 * duration
+    return size
+
+
+class FormatPlan:
+    """The formats chosen for one video and the ffmpeg work needed to turn them into the output file."""
+    def __init__(self, kind, format_spec, height=None, ext=None, audio_codec=None, audio_action=None,
+                 cpu_seconds=0.0, reason=""):
+        self.kind = kind  # 'progressive', 'merge', 'audio' or 'fallback'
+        self.format_spec = format_spec
+        self.height = height
+        self.ext = ext
+        self.audio_codec = audio_codec
+        self.audio_action = audio_action  # for audio plans: 'keep', 'copy' or 'transcode'
+        self.cpu_seconds = cpu_seconds  # estimated post-processing CPU time, None when sizes are unknown
+        self.reason = reason
+
+    def describe(self):
+        label = f"{self.height}p {self.kind}" if self.height else self.kind
+        work = {'merge': "stream-copy merge", 'fallback': "chosen by yt-dlp"}.get(self.kind, "no post-processing")
+        if self.kind == 'audio':
+            codec = self.audio_codec or "audio"
+            work = {'keep': "kept as downloaded", 'copy': f"{codec} stream copy",
+                    'transcode': f"{codec} re-encoded"}.get(self.audio_action, work)
+        cost = f"{self.cpu_seconds:.1f}s" if self.cpu_seconds is not None else "unknown"
+        return f"{label} [{self.format_spec}] -> {self.ext or '?'}, {work}, est. CPU {cost}; {self.reason}"
+
+    def to_dict(self):
+        return {'kind': self.kind, 'format': self.format_spec, 'height': self.height, 'ext': self.ext,
+                'audio_codec': self.audio_codec, 'audio_action': self.audio_action,
+                'cpu_seconds': self.cpu_seconds, 'reason': self.reason}
+
+    def __repr__(self):
+        return f"FormatPlan({self.describe()})"
+
+
+class FormatPlanner:
+    """
+    Chooses, per video, the cheapest set of formats that meets a quality option.
+    Formats are taken in yt-dlp's own order (worst to best). A progressive stream at the best
+    height available within the cap wins outright: it needs no merge at all. Otherwise the best
+    video-only stream is paired with an audio stream in a matching container so the merge is a
+    plain stream copy into mp4. For audio, a native AAC/Opus/Vorbis stream is kept as-is when
+    `keep_native_audio` is set; otherwise it is re-encoded to MP3 as the quality option promises.
+    A planner is part of the yt-dlp option set, so its repr must identify its settings.
+    """
+    def __init__(self, quality_choice, prefer_progressive=True, keep_native_audio=False):
+        self.height = target_height(quality_choice)
+        self.audio_only = 'audio' in quality_choice.lower()
+        self.prefer_progressive = prefer_progressive
+        self.keep_native_audio = keep_native_audio
+
+    def __repr__(self):
+        return (f"FormatPlanner(height={self.height}, audio_only={self.audio_only}, "
+                f"prefer_progressive={self.prefer_progressive}, keep_native_audio={self.keep_native_audio})")
+
+    @property
+    def tier(self):
+        """Names what downloads with this planner produce, e.g. 'video-720p' or 'audio-mp3'."""
+        if self.audio_only:
+            return 'audio-native' if self.keep_native_audio else 'audio-mp3'
+        return f"video-{self.height}p" if self.height else 'video-best'
+
+    def variant(self, format_id):
+        """Identifies the content a download of `format_id` ends up as: the formats, plus any conversion."""
+        return f"{format_id}>{self.tier}" if self.audio_only else format_id
+
+    def postprocessors(self):
+        """The yt-dlp postprocessors every download with this planner needs."""
+        if not self.audio_only:
+            return []
+        # 'best' leaves a common audio file alone and stream-copies anything else into one.
+        codec = 'best' if self.keep_native_audio else 'mp3'
+        return [{'key': 'FFmpegExtractAudio', 'preferredcodec': codec, 'preferredquality': '192'}]
+
+    def plan(self, formats, duration=None):
+        """Returns a FormatPlan for one video's (sorted, worst first) format list."""
+        if not formats:
+            return FormatPlan('fallback', 'best/bestvideo+bestaudio', cpu_seconds=None, reason="no format list")
+        if self.audio_only:
+            return self._plan_audio(formats, duration)
+        return self._plan_video(formats, duration)
+
+    def estimate_size(self, formats, duration=None):
+        """Bytes the plan for a format list would download, or None if a chosen format's size is unknown."""
+        plan = self.plan(formats, duration)
+        by_id = {f.get('format_id'): f for f in formats}
+        sizes = [_size(by_id[format_id], duration) if format_id in by_id else None
+                 for format_id in plan.format_spec.split('+')]
+        return sum(sizes) if all(sizes) else None
+
+    # --- Video ---
+    def _plan_video(self, formats, duration):
+        videos = [f for f in formats if _has_video(f)]
+        if not videos:
+            return self._plan_audio(formats, duration, transcode=False)
+        cap = self.height or float('inf')
+        eligible = [f for f in videos if (f.get('height') or 0) <= cap]
+        if not eligible:
+            # Nothing within the cap: settle for the smallest picture there is.
+            lowest = min(f.get('height') or 0 for f in videos)
+            eligible = [f for f in videos if (f.get('height') or 0) == lowest]
+        best_height = max(f.get('height') or 0 for f in eligible)
+        top = [f for f in eligible if (f.get('height') or 0) == best_height]
+        progressive = [f for f in top if _has_audio(f)]
+        video_only = [f for f in top if not _has_audio(f)]
+        audios = [f for f in formats if not _has_video(f) and _has_audio(f)]
+
+        if progressive and (self.prefer_progressive or not video_only or not audios):
+            chosen = self._prefer_mp4(progressive)
+            return FormatPlan('progressive', chosen['format_id'], best_height or None, chosen.get('ext'),
+                              cpu_seconds=self._fixup_cost([chosen], duration),
+                              reason="single file with audio at the target height")
+        if not audios:
+            # No separate audio: a lower progressive stream beats a silent one.
+            fallback = [f for f in eligible if _has_audio(f)]
+            chosen = (max(fallback, key=lambda f: f.get('height') or 0) if fallback
+                      else self._prefer_mp4(video_only))
+            return FormatPlan('progressive', chosen['format_id'], chosen.get('height'), chosen.get('ext'),
+                              cpu_seconds=0.0, reason="no separate audio streams")
+
+        video = self._prefer_mp4(video_only)
+        mp4 = video.get('ext') == 'mp4' and _codec(video, 'vcodec').startswith(MP4_VIDEO_CODECS)
+        matching = [f for f in audios if (f.get('ext') in ('m4a', 'mp4')) == mp4]
+        audio = (matching or audios)[-1]
+        ext = 'mp4' if mp4 and audio.get('ext') in ('m4a', 'mp4') else None
+        size = [_size(f, duration) for f in (video, audio)]
+        cost = sum(size) / REMUX_BYTES_PER_SECOND if all(size) else None
+        return FormatPlan('merge', f"{video['format_id']}+{audio['format_id']}", best_height or None, ext or 'mkv/webm',
+                          audio_codec=_codec(audio, 'acodec') or None, cpu_seconds=cost,
+                          reason="no progressive stream at the target height; merged without re-encoding")
+
+    @staticmethod
+    def _prefer_mp4(candidates):
+        """The last (best) candidate, preferring mp4 so the output container stays mp4."""
+        return max(enumerate(candidates), key=lambda item: (item[1].get('ext') == 'mp4', item[0]))[1]
+
+    @staticmethod
+    def _fixup_cost(chosen, duration):
+        # yt-dlp remuxes DASH m4a containers into a normal one after download.
+        sizes = [_size(f, duration) or 0 for f in chosen if f.get('container') == 'm4a_dash']
+        return sum(sizes) / REMUX_BYTES_PER_SECOND
+
+    # --- Audio ---
+    def _plan_audio(self, formats, duration, transcode=True):
+        audios = [f for f in formats if not _has_video(f) and _has_audio(f)] or [f for f in formats if _has_audio(f)]
+        if not audios:
+            return FormatPlan('fallback', 'bestaudio/best', cpu_seconds=None, reason="no format with audio")
+        native = [f for f in audios if _codec(f, 'acodec').startswith(NATIVE_AUDIO_CODECS)]
+        if self.keep_native_audio and native:
+            chosen = max(enumerate(native), key=lambda item: (item[1].get('abr') or item[1].get('tbr') or 0, item[0]))[1]
+        else:
+            chosen = audios[-1]
+        codec = _codec(chosen, 'acodec') or None
+        size = _size(chosen, duration)
+        if not transcode:
+            action, cost = 'keep', self._fixup_cost([chosen], duration)
+        elif self.keep_native_audio and chosen in native:
+            common = chosen.get('ext') in ('m4a', 'mp3', 'opus', 'ogg', 'flac')
+            action, cost = ('keep', self._fixup_cost([chosen], duration)) if common else ('copy', size / REMUX_BYTES_PER_SECOND if size else None)
+        elif codec == 'mp3':
+            action, cost = 'copy', size / REMUX_BYTES_PER_SECOND if size else None
+        else:
+            action, cost = 'transcode', duration / MP3_ENCODE_SPEED if duration else None
+        ext = {'keep': chosen.get('ext'), 'copy': AUDIO_COPY_EXTS.get(codec), 'transcode': 'mp3'}[action]
+        reason = {'keep': "already in a common audio format", 'copy': "stored without re-encoding",
+                  'transcode': "re-encoded to 192k MP3"}[action]
+        return FormatPlan('audio', chosen['format_id'], ext=ext, audio_codec=codec, audio_action=action,
+                          cpu_seconds=cost, reason=reason)
@@ -0,0 +1,283 @@
+# ingest.py
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+# --- CANONICALIZATION ---
+YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com', 'www.youtube-nocookie.com'}
+YOUTUBE_ID = re.compile(r'^[\w-]{11}$')
+YOUTUBE_PATH_ID = re.compile(r'^/(?:shorts|embed|live|v)/([\w-]{11})')
+TRACKING_PARAMS = {'si', 'feature', 'fbclid', 'gclid', 'pp', 'ab_channel'}
+RELATIVE_TIME = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def url_key(url):
+    """
+    The key a raw input line is de-duplicated by, without any network access. Only the key is
+    normalized: the line itself is what gets downloaded.
+    YouTube variants (youtu.be/X, watch?v=X&t=10, /shorts/X, m. and music. hosts) share "youtube:X";
+    a YouTube URL with a list= (which yt-dlp downloads as the whole playlist) is keyed by the list.
+    Other URLs are keyed normalized (lower-case host, no fragment, sorted query without tracking params).
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlparse(url)
+    host = (parts.hostname or '').lower()
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host == 'youtu.be' or host in YOUTUBE_HOSTS:
+        params = dict(query)
+        if params.get('list'):
+            return f"youtube:playlist:{params['list']}"
+        if host == 'youtu.be':
+            video_id = parts.path.lstrip('/')[:11]
+        else:
+            video_id = params.get('v') if parts.path == '/watch' else None
+            if video_id is None:
+                match = YOUTUBE_PATH_ID.match(parts.path)
+                video_id = match.group(1) if match else None
+        if video_id and YOUTUBE_ID.match(video_id):
+            return f'youtube:{video_id}'
+
+    kept = sorted((k, v) for k, v in query if k not in TRACKING_PARAMS and not k.startswith('utm_'))
+    netloc = host + (f':{parts.port}' if parts.port else '')
+    return urlunparse((parts.scheme.lower(), netloc, parts.path or '/', '', urlencode(kept), ''))
+
+
+# --- LINK TAGS ---
+def parse_deadline(text, now=None):
+    """
+    Epoch seconds for a deadline tag: relative ('90m', '2h', '1d'), a time of day ('18:30', the next
+    one to come) or an ISO date/time ('2026-03-01T09:00'). Returns None if it cannot be parsed.
+    """
+    now = time.time() if now is None else now
+    match = RELATIVE_TIME.match(text)
+    if match:
+        return now + float(match.group(1)) * TIME_UNITS[match.group(2)]
+    try:
+        clock = datetime.time.fromisoformat(text)
+    except ValueError:
+        clock = None
+    if clock is not None and ':' in text:
+        today = datetime.datetime.fromtimestamp(now)
+        deadline = datetime.datetime.combine(today.date(), clock)
+        if deadline.timestamp() <= now:
+            deadline += datetime.timedelta(days=1)
+        return deadline.timestamp()
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_link_line(line):
+    """
+    Splits a links-file line into (url, options). Tags may follow the URL, separated by spaces:
+    `priority=N` (higher runs first), `deadline=2h|18:30|2026-03-01T09:00` and `weight=N`
+    (bandwidth share). Unknown or malformed tags are ignored.
+    """
+    url, *tags = line.split()
+    options = {}
+    for tag in tags:
+        name, _, value = tag.partition('=')
+        try:
+            if name == 'priority':
+                options['priority'] = int(value)
+            elif name == 'weight':
+                options['weight'] = float(value)
+            elif name == 'deadline' and parse_deadline(value) is not None:
+                options['deadline'] = parse_deadline(value)
+        except ValueError:
+            pass
+    return url, options
+
+
+# --- BOUNDED-MEMORY DEDUPLICATION ---
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, false positives at about `error_rate`."""
+    def __init__(self, capacity=5_000_000, error_rate=1e-5, bits=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class Deduplicator:
+    """
+    Exact set of the most recent keys in front of a Bloom filter covering everything seen.
+    Memory stays fixed however long the input is. A key the Bloom filter has seen but the
+    recent set has forgotten is a probable duplicate and is skipped unless `keep_probable` is set.
+    """
+    def __init__(self, recent_items=100_000, bloom=None, keep_probable=False):
+        self.recent_items = recent_items
+        self.bloom = bloom or BloomFilter()
+        self.keep_probable = keep_probable
+        self._recent = OrderedDict()
+        self.unique = self.duplicates = self.probable_duplicates = 0
+
+    def seen(self, key):
+        """Records `key` and returns True if it should be skipped as a duplicate."""
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            self.duplicates += 1
+            return True
+        probable = key in self.bloom
+        self._recent[key] = None
+        if len(self._recent) > self.recent_items:
+            self._recent.popitem(last=False)
+        if probable:
+            self.probable_duplicates += 1
+            return not self.keep_probable
+        self.bloom.add(key)
+        self.unique += 1
+        return False
+
+
+def dedupe_urls(urls, deduplicator=None):
+    """
+    De-duplicates a small in-memory list of URLs by their url_key, preserving order.
+    Lines with tags (see parse_link_line) come back as (url, options) pairs.
+    """
+    deduplicator = deduplicator or Deduplicator(bloom=BloomFilter(capacity=max(1000, len(urls) * 4)))
+    result = []
+    for line in urls:
+        url, options = parse_link_line(line)
+        if not deduplicator.seen(url_key(url)):
+            result.append((url, options) if options else url)
+    return result
+
+
+# --- STREAMING INPUT WITH CHECKPOINTS ---
+class UrlStream:
+    """
+    Lazily yields the URLs of a huge links file, de-duplicated by url_key; tagged lines
+    (see parse_link_line) are yielded as (url, options) pairs.
+    The byte offset reached (plus the Bloom filter) is checkpointed every `checkpoint_interval`
+    seconds rather than per line, since the filter can be tens of MB; after a
+    restart reading resumes where it stopped without re-scanning the head of the file.
+    The checkpoint is removed once the file has been read to the end, and written when the
+    consumer stops early.
+    """
+    def __init__(self, path, checkpoint_path=None, deduplicator=None, checkpoint_interval=30.0):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.deduplicator = deduplicator or Deduplicator()
+        self.checkpoint_interval = checkpoint_interval
+        self.offset = 0
+        self.lines_read = 0
+        self.resumed = False
+
+    @classmethod
+    def from_config(cls, path, config):
+        """Builds a stream using the `downloader.ingest` section of a ConfigManager."""
+        bloom = BloomFilter(capacity=config.get('downloader.ingest.bloom_capacity', 5_000_000),
+                            error_rate=config.get('downloader.ingest.bloom_error_rate', 1e-5))
+        deduplicator = Deduplicator(recent_items=config.get('downloader.ingest.recent_items', 100_000), bloom=bloom)
+        return cls(path, checkpoint_path=config.get('downloader.ingest.checkpoint_file', 'zenith_ingest.ckpt'),
+                   deduplicator=deduplicator,
+                   checkpoint_interval=config.get('downloader.ingest.checkpoint_interval', 30.0))
+
+    def _fingerprint(self):
+        """Identifies the file so a checkpoint is never applied to different content."""
+        with open(self.path, 'rb') as f:
+            head = f.read(4096)
+        return hashlib.sha1(head).hexdigest()
+
+    def _load_checkpoint(self, fingerprint):
+        if not self.checkpoint_path:
+            return
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            with open(self.checkpoint_path + '.bloom', 'rb') as f:
+                bits = bytearray(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        bloom = self.deduplicator.bloom
+        if (state.get('fingerprint') != fingerprint or state.get('offset', 0) > os.path.getsize(self.path)
+                or state.get('num_bits') != bloom.num_bits or len(bits) != len(bloom.bits)):
+            return
+        bloom.bits = bits
+        self.offset = state['offset']
+        self.lines_read = state.get('lines_read', 0)
+        self.resumed = True
+
+    def checkpoint(self, fingerprint):
+        if not self.checkpoint_path:
+            return
+        bloom = self.deduplicator.bloom
+        # Write both files to temporaries first so a crash never leaves a torn checkpoint.
+        with open(self.checkpoint_path + '.bloom.tmp', 'wb') as f:
+            f.write(bloom.bits)
+        state = {'path': os.path.abspath(self.path), 'fingerprint': fingerprint, 'offset': self.offset,
+                 'lines_read': self.lines_read, 'num_bits': bloom.num_bits, 'saved_at': time.time()}
+        with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(self.checkpoint_path + '.bloom.tmp', self.checkpoint_path + '.bloom')
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def has_urls(self):
+        """True if the file holds at least one URL line; reads only as far as the first one."""
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                line = raw.strip()
+                if line and not line.startswith(b'#'):
+                    return True
+        return False
+
+    def clear_checkpoint(self):
+        for suffix in ('', '.bloom'):
+            try:
+                os.remove(self.checkpoint_path + suffix)
+            except (FileNotFoundError, TypeError):
+                pass
+
+    def __iter__(self):
+        fingerprint = self._fingerprint()
+        self._load_checkpoint(fingerprint)
+        last_checkpoint = time.monotonic()
+        finished = False
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                for raw in f:
+                    # Advance before yielding: a URL the consumer has taken is never read twice.
+                    self.offset += len(raw)
+                    self.lines_read += 1
+                    line = raw.decode('utf-8', errors='replace').strip()
+                    if line and not line.startswith('#'):
+                        url, options = parse_link_line(line)
+                        if not self.deduplicator.seen(url_key(url)):
+                            yield (url, options) if options else url
+                    if self.lines_read % 1024 == 0 and time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                        self.checkpoint(fingerprint)
+                        last_checkpoint = time.monotonic()
+            finished = True
+        finally:
+            if finished:
+                self.clear_checkpoint()
+            else:
+                self.checkpoint(fingerprint)
@@ -0,0 +1,124 @@
+# journal.py
+
+import json
+import os
+import time
+import uuid
+from threading import Lock
+
+STATES = ("queued", "extracting", "downloading", "post-processing", "done", "failed")
+TERMINAL_STATES = ("done", "failed")
+
+
+class JournalEntry:
+    """The replayed state of one job."""
+    def __init__(self, job_id, url, options=None):
+        self.job_id = job_id
+        self.url = url
+        self.options = options or {}
+        self.state = "queued"
+        self.partials = []
+        self.updated_at = None
+
+    def to_record(self):
+        return {'job': self.job_id, 'url': self.url, 'state': self.state, 'options': self.options,
+                'partials': self.partials, 't': self.updated_at}
+
+
+class JobJournal:
+    """
+    Append-only, fsync'd JSON-lines log of job state transitions (a write-ahead log).
+    Every transition is on disk before the work it describes starts, so after a crash the
+    last line of each job says exactly how far it got. Opening the journal replays it and
+    compacts it down to the jobs that are still incomplete.
+    """
+    def __init__(self, path="zenith_journal.jsonl", fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = Lock()
+        self._entries = self._replay()
+        self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self):
+        entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A torn final line from a crash mid-write
+                    entry = entries.get(record['job'])
+                    if entry is None:
+                        entry = entries[record['job']] = JournalEntry(record['job'], record['url'])
+                    entry.options = record.get('options') or entry.options
+                    entry.state = record.get('state', entry.state)
+                    for partial in record.get('partials') or []:
+                        if partial not in entry.partials:
+                            entry.partials.append(partial)
+                    entry.updated_at = record.get('t')
+        except FileNotFoundError:
+            pass
+        return {job_id: e for job_id, e in entries.items() if e.state not in TERMINAL_STATES}
+
+    def _compact(self):
+        """Rewrites the log with one line per incomplete job, atomically."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry.to_record()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    # --- Recording ---
+    def begin(self, url, options=None):
+        """Records a newly queued job and returns its journal id."""
+        job_id = uuid.uuid4().hex
+        # Collaborators (index, cache, ...) are not persisted; playlist fields in extra_info are already JSON-safe.
+        options = {k: v for k, v in (options or {}).items()
+                   if isinstance(v, (str, int, float, bool, type(None))) or (k == 'extra_info' and isinstance(v, dict))}
+        entry = JournalEntry(job_id, url, options)
+        entry.updated_at = time.time()
+        with self._lock:
+            self._entries[job_id] = entry
+        self._append(entry.to_record())
+        return job_id
+
+    def transition(self, job_id, state, partial=None):
+        """Records a state change (and optionally a partial file now being written)."""
+        if state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return
+            if entry.state == state and (partial is None or partial in entry.partials):
+                return  # Nothing new to persist
+            entry.state = state
+            entry.updated_at = time.time()
+            if partial is not None and partial not in entry.partials:
+                entry.partials.append(partial)
+            if state in TERMINAL_STATES:
+                del self._entries[job_id]
+        self._append({'job': job_id, 'url': entry.url, 'state': state,
+                      'partials': [partial] if partial else [], 't': entry.updated_at})
+
+    # --- Recovery ---
+    def incomplete(self):
+        """Jobs that were queued or in flight when the previous process stopped."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
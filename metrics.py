@@ -0,0 +1,316 @@
+# metrics.py
+
+import datetime
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Histogram bucket upper bounds; the +Inf bucket is implied.
+TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SPEED_BUCKETS = tuple(2 ** n * 1024 for n in range(4, 19, 2))  # 16 KiB/s .. 256 MiB/s
+
+# yt-dlp postprocessor keys (class name minus 'PP') and the job phase their run time counts towards.
+PP_PHASES = {'Merger': 'merge', 'ExtractAudio': 'transcode', 'VideoConvertor': 'transcode',
+             'VideoRemuxer': 'remux', 'MoveFilesAfterDownload': 'move'}
+
+
+def pp_phase(pp):
+    """The phase a yt-dlp postprocessor's run is timed under."""
+    key = type(pp).__name__[:-2] if type(pp).__name__.endswith('PP') else type(pp).__name__
+    if key.startswith('Fixup'):
+        return 'fixup'
+    return PP_PHASES.get(key, 'postprocess')
+
+
+def error_class(exc):
+    """A short, low-cardinality name for what went wrong, looking through yt-dlp's wrappers."""
+    if exc is None:
+        return 'DownloadFailed'
+    # DownloadError carries the original exception in exc_info, ExtractorError in cause.
+    inner = (getattr(exc, 'exc_info', None) or (None, None))[1] or getattr(exc, 'cause', None)
+    if isinstance(inner, BaseException) and inner is not exc:
+        return error_class(inner)
+    return type(exc).__name__
+
+
+def timed(job_metrics, phase):
+    """job_metrics.phase(phase), or a no-op when there is nothing to record into."""
+    return job_metrics.phase(phase) if job_metrics is not None else nullcontext()
+
+
+class JobMetrics:
+    """
+    Timings and counters for one job, filled in by the engine and download_video.
+    Phases are exclusive: time spent in a phase nested inside another (a transfer inside
+    extraction, a merge inside the transfer's post-processing) counts only towards the inner one.
+    Nesting is tracked per thread, so the post-processing stage can time a job's merge while
+    its download worker is still winding down.
+    """
+    def __init__(self, job_id=None, url=None):
+        self.job_id = job_id
+        self.url = url
+        self.created = time.time()
+        self.phases = {}  # phase -> seconds
+        self.bytes = 0
+        self.files = 0
+        self.errors = []  # error class of every failure reported, oldest first
+        self._started = time.perf_counter()
+        self._queued_at = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        started = time.perf_counter()
+        stack.append(0.0)  # time spent in phases nested inside this one
+        try:
+            yield
+        finally:
+            nested = stack.pop()
+            elapsed = time.perf_counter() - started
+            if stack:
+                stack[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def queued(self):
+        self._queued_at = time.perf_counter()
+
+    def dequeued(self):
+        if self._queued_at is not None:
+            self.add('queued', time.perf_counter() - self._queued_at)
+            self._queued_at = None
+
+    def add_file(self, nbytes):
+        """Counts one finished download of `nbytes` (fragments included)."""
+        with self._lock:
+            self.bytes += nbytes
+            self.files += 1
+
+    def fail(self, exc=None):
+        with self._lock:
+            self.errors.append(error_class(exc))
+
+    @property
+    def error_class(self):
+        return self.errors[-1] if self.errors else None
+
+    @property
+    def speed(self):
+        """Bytes per second of transfer time, or None before anything was transferred."""
+        transfer = self.phases.get('transfer')
+        return self.bytes / transfer if self.bytes and transfer else None
+
+    def to_dict(self):
+        with self._lock:
+            phases = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+            errors = list(self.errors)
+        speed = self.speed
+        return {
+            'time': datetime.datetime.fromtimestamp(self.created, datetime.timezone.utc).isoformat(timespec='seconds'),
+            'job_id': self.job_id,
+            'url': self.url,
+            'seconds': round(time.perf_counter() - self._started, 4),
+            'phases': phases,
+            'bytes': self.bytes,
+            'files': self.files,
+            'speed': round(speed) if speed else None,
+            'errors': errors,
+            'error_class': errors[-1] if errors else None,
+        }
+
+
+# --- Process-wide metrics ---
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}  # label values -> count
+
+    def inc(self, amount=1, *label_values):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {count}")
+        return lines
+
+
+class _Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.buckets, self.labels = name, help, tuple(buckets), tuple(labels)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets + ('+Inf',), state[:len(self.buckets)] + [state[-1]]):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (bound,))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {state[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, updated once per finished job (never per progress
+    tick, so it can stay on in production), plus gauges read when the registry is rendered.
+    Every job record is also handed to the registry's sinks: objects with emit(record) and close().
+    """
+    def __init__(self, sinks=()):
+        self._lock = threading.Lock()
+        self.sinks = list(sinks)
+        self._gauges = {}  # name -> (help, fn)
+        self.jobs = _Counter('zenith_jobs_total', 'Jobs finished, by final status.', ('status',))
+        self.errors = _Counter('zenith_job_errors_total', 'Failures reported by download attempts, by error class.', ('error',))
+        self.retries = _Counter('zenith_job_retries_total', 'Extra attempts made for jobs that failed.')
+        self.bytes = _Counter('zenith_downloaded_bytes_total', 'Bytes written by finished downloads.')
+        self.phase_seconds = _Histogram('zenith_job_phase_seconds', 'Time jobs spent in each phase.', TIME_BUCKETS, ('phase',))
+        self.job_seconds = _Histogram('zenith_job_seconds', 'Time from queuing a job to its final status.', TIME_BUCKETS)
+        self.speed = _Histogram('zenith_job_speed_bytes', 'Bytes per second of transfer time, per job.', SPEED_BUCKETS)
+
+    @classmethod
+    def from_config(cls, config, jsonl_file=None, prometheus_port=None):
+        """Builds the registry from the `downloader.metrics` section; None when metrics are disabled."""
+        if not config.get('downloader.metrics.enabled', True):
+            return None
+        registry = cls()
+        jsonl_file = jsonl_file or config.get('downloader.metrics.jsonl_file', '')
+        if jsonl_file:
+            registry.add_sink(JsonLinesSink(jsonl_file))
+        port = prometheus_port if prometheus_port is not None else config.get('downloader.metrics.prometheus_port', 0)
+        if port:
+            registry.add_sink(PrometheusEndpoint(registry, config.get('downloader.metrics.prometheus_host', '127.0.0.1'), port))
+        return registry
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def gauge(self, name, help, fn):
+        """Registers fn() as the current value of a gauge; a later gauge of the same name replaces it."""
+        with self._lock:
+            self._gauges[name] = (help, fn)
+
+    def record(self, job_metrics, **fields):
+        """Folds a finished job into the process-wide metrics and emits its record to every sink."""
+        record = job_metrics.to_dict()
+        record.update(fields)
+        with self._lock:
+            self.jobs.inc(1, record.get('status') or 'unknown')
+            for error in record['errors']:
+                self.errors.inc(1, error)
+            if record.get('attempts', 1) > 1:
+                self.retries.inc(record['attempts'] - 1)
+            self.bytes.inc(record['bytes'])
+            for phase, seconds in record['phases'].items():
+                self.phase_seconds.observe(seconds, phase)
+            self.job_seconds.observe(record['seconds'])
+            if record['speed']:
+                self.speed.observe(record['speed'])
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"[Metrics] Sink failed: {e}")
+        return record
+
+    def phase_totals(self):
+        """Seconds spent in each phase across all finished jobs, largest first."""
+        with self._lock:
+            totals = {values[0]: state[-2] for values, state in self.phase_seconds.values.items()}
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+    def render(self):
+        """The Prometheus text exposition format of everything in the registry."""
+        with self._lock:
+            lines = []
+            for metric in (self.jobs, self.errors, self.retries, self.bytes, self.phase_seconds, self.job_seconds, self.speed):
+                lines += metric.render()
+            gauges = list(self._gauges.items())
+        for name, (help, fn) in gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+# --- Sinks ---
+class JsonLinesSink:
+    """Appends one JSON object per finished job to a file."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, record):
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusEndpoint:
+    """Serves a registry at http://host:port/metrics in the Prometheus text format; records are pulled, not pushed."""
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # only paid for when enabled
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="zenith-metrics", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        pass
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
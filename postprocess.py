@@ -0,0 +1,100 @@
+# postprocess.py
+
+import os
+import queue
+import threading
+import time
+
+
+class PostProcessStage:
+    """
+    Bounded pool for the CPU-heavy tail of a download: merging formats and transcoding audio.
+    Download workers hand finished files over (they wait in the staging area) and go straight
+    back to the network, while this pool runs the ffmpeg work alongside.
+    Each worker drives one ffmpeg process at a time, so `max_workers` caps concurrent ffmpeg
+    processes (default: one per core). submit() blocks while `max_queued` tasks are waiting,
+    which holds download workers back when the CPU cannot keep up with the network.
+    """
+    def __init__(self, max_workers=None, max_queued=8):
+        self.max_workers = max(1, int(max_workers or os.cpu_count() or 2))
+        self._queue = queue.Queue(maxsize=max(1, int(max_queued)))
+        self._lock = threading.Lock()
+        self._workers = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0
+        self.busy_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the stage from the `downloader.postprocess` section; 0 workers means one per core."""
+        return cls(max_workers=config.get('downloader.postprocess.workers', 0),
+                   max_queued=config.get('downloader.postprocess.max_queued', 8))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._workers:
+                return
+            for n in range(self.max_workers):
+                worker = threading.Thread(target=self._run, name=f"zenith-postprocess-{n}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, task, callback=None, cancel_event=None):
+        """
+        Queues `task()` (returning True on success) and calls `callback(result)` on the stage
+        thread when it has run. Blocks while the queue is full; returns False without queuing
+        if `cancel_event` is set while waiting.
+        """
+        self._ensure_started()
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            try:
+                self._queue.put((task, callback), timeout=0.5)
+            except queue.Full:
+                continue
+            with self._lock:
+                self.submitted += 1
+            return True
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            task, callback = item
+            with self._lock:
+                self.busy += 1
+            started = time.monotonic()
+            try:
+                result = task()
+            except Exception as e:
+                print(f"\n[PostProcess] Task failed: {e}")
+                result = False
+            with self._lock:
+                self.busy -= 1
+                self.busy_seconds += time.monotonic() - started
+                if result:
+                    self.completed += 1
+                elif result is not None:
+                    self.failed += 1  # None means the task was skipped, e.g. after a halt
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"\n[PostProcess] Callback failed: {e}")
+
+    def close(self):
+        """Lets queued tasks finish, then stops the workers."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
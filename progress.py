@@ -0,0 +1,98 @@
+# progress.py
+
+import threading
+import time
+
+import downloader
+
+
+class ProgressBus:
+    """
+    Coalesces progress from many download threads. Publishing only replaces the latest
+    snapshot for a job (latest-value-wins); a single flusher thread hands the changed
+    snapshots to every subscriber at a fixed frame rate, however fast yt-dlp reports.
+    """
+    def __init__(self, fps=10):
+        self.interval = 1.0 / max(1, fps)
+        self._lock = threading.Lock()
+        self._latest = {}  # job key -> snapshot published since the last frame
+        self._finished = []  # terminal snapshots, kept in order so none are coalesced away
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Registers callback(updates, finished): a dict of key -> snapshot and a list of (key, snapshot)."""
+        self._subscribers.append(callback)
+        return callback
+
+    def publish(self, key, snapshot):
+        """
+        Called from download threads with a snapshot from downloader.compact_progress
+        (what download_video hands its progress_callback). Never blocks on subscribers.
+        """
+        with self._lock:
+            self._latest[key] = snapshot
+            if snapshot.get('status') == 'finished' and snapshot.get('postprocessor') is None:
+                self._finished.append((key, snapshot))
+
+    def flush(self):
+        """Delivers everything published since the last frame."""
+        with self._lock:
+            if not self._latest and not self._finished:
+                return
+            updates, self._latest = self._latest, {}
+            finished, self._finished = self._finished, []
+        for callback in self._subscribers:
+            try:
+                callback(updates, finished)
+            except Exception as e:
+                print(f"[ProgressBus] Subscriber failed: {e}")
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="zenith-progress", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the flusher after delivering a final frame."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+class ConsoleProgressPrinter:
+    """
+    Bus subscriber that keeps the familiar single console progress line, once per frame.
+    `status`, if given, returns extra text for the line, such as the queue's ETA.
+    """
+    STALE_AFTER = 5.0  # seconds without news before a job stops counting as active
+
+    def __init__(self, status=None):
+        self._last_seen = {}
+        self.status = status
+
+    def __call__(self, updates, finished):
+        now = time.monotonic()
+        for key, snapshot in updates.items():
+            self._last_seen[key] = now
+        for key, snapshot in finished:
+            self._last_seen.pop(key, None)
+            downloader.print_progress(snapshot)
+        downloading = [s for s in updates.values() if s.get('status') == 'downloading']
+        if downloading:
+            self._last_seen = {k: t for k, t in self._last_seen.items() if now - t < self.STALE_AFTER}
+            others = len(self._last_seen) - 1
+            extra = f" (+{others} more active)" if others > 0 else ""
+            if self.status is not None:
+                extra += self.status()
+            downloader.print_progress(downloading[-1], extra)
@@ -0,0 +1,165 @@
+# scheduling.py
+
+import time
+
+from formats import FormatPlanner
+
+POLICIES = ('fifo', 'sjf', 'priority', 'deadline')
+SIZED_POLICIES = ('sjf', 'deadline')  # policies whose order depends on job sizes
+DEFAULT_JOB_BYTES = 64 * 1024 * 1024  # assumed size of a job nothing is known about, until jobs finish
+DEFAULT_JOB_SPEED = 2 * 1024 * 1024  # assumed bytes/s of one job, until jobs finish
+
+# Typical bytes per second of content by height, for estimating a size from a duration alone.
+VIDEO_BYTES_PER_SECOND = ((360, 90_000), (480, 160_000), (720, 340_000), (1080, 620_000), (1440, 1_300_000),
+                          (2160, 2_600_000))
+AUDIO_BYTES_PER_SECOND = 24_000  # 192 kbit/s
+
+
+def content_rate(planner):
+    """Rough bytes per second of content a FormatPlanner's downloads come to."""
+    if planner.audio_only:
+        return AUDIO_BYTES_PER_SECOND
+    for height, rate in VIDEO_BYTES_PER_SECOND:
+        if planner.height is not None and planner.height <= height:
+            return rate
+    return VIDEO_BYTES_PER_SECOND[-1][1]  # no cap, or above every listed height
+
+
+def format_duration(seconds):
+    """'45s', '12m 5s', '3h 20m' or '2d 4h'."""
+    seconds = int(max(0, seconds))
+    for unit, size, sub, sub_size in (('d', 86400, 'h', 3600), ('h', 3600, 'm', 60), ('m', 60, 's', 1)):
+        if seconds >= size:
+            return f"{seconds // size}{unit} {seconds % size // sub_size}{sub}"
+    return f"{seconds}s"
+
+
+class JobScheduler:
+    """
+    Decides the order in which the engine's queued jobs run, and estimates when the queue will drain.
+    Policies ('fifo', 'sjf', 'priority', 'deadline'):
+      fifo      input order, hosts served round-robin (tags are ignored);
+      priority  higher `priority` tags first, input order within a priority;
+      sjf       higher priority first, then the smallest expected download;
+      deadline  higher priority first, then the least slack: the job that must start soonest
+                to finish by its `deadline` tag, given its size; jobs without a deadline last, smallest first.
+    Sizes are estimated without network access: from format sizes in the metadata cache, else from
+    a duration (cached, or given by a playlist listing) at a typical bitrate for the quality option.
+    The cache is only consulted under sjf and deadline, since finding a URL's entry means matching it
+    against every extractor; the other policies estimate from playlist durations alone, for the ETA.
+    Ordering only applies to jobs waiting in the engine's queue (up to its max_pending).
+    """
+    def __init__(self, policy='fifo'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}'; choose from {', '.join(POLICIES)}.")
+        self.policy = policy
+        self.round_robin = policy == 'fifo'
+        self.started_at = None
+        self.first_result_at = None
+        self.completed = 0
+        self.completed_bytes = 0
+        self.transfer_seconds = 0.0
+        self.pending_bytes = 0  # estimated bytes of queued jobs with an estimate
+        self.pending_unknown = 0  # queued jobs without one
+        self._active = set()
+
+    @classmethod
+    def from_config(cls, config, policy=None):
+        return cls(policy or config.get('downloader.scheduling.policy', 'fifo'))
+
+    # --- Estimates ---
+    def estimate(self, url, options):
+        """Expected bytes for a URL with the given download options, or None if nothing is known."""
+        planner = FormatPlanner(options.get('quality_choice', ''), keep_native_audio=options.get('keep_native_audio', False))
+        cache = options.get('metadata_cache')
+        info = (cache.peek(url) if cache is not None and self.policy in SIZED_POLICIES else None) or {}
+        if info.get('_type', 'video') != 'video':
+            return None  # A playlist: its entries are estimated when they are queued
+        duration = info.get('duration') or (options.get('extra_info') or {}).get('duration')
+        if info.get('formats'):
+            size = planner.estimate_size(info['formats'], duration)
+            if size:
+                return int(size)
+        return int(duration * content_rate(planner)) if duration else None
+
+    @property
+    def average_job_bytes(self):
+        return self.completed_bytes / self.completed if self.completed else DEFAULT_JOB_BYTES
+
+    @property
+    def job_speed(self):
+        """Observed bytes per second of transfer time of a single job."""
+        return self.completed_bytes / self.transfer_seconds if self.transfer_seconds else DEFAULT_JOB_SPEED
+
+    def key(self, job):
+        """Sort key of a queued job; the lowest runs first. The engine breaks ties by queuing order."""
+        if self.policy == 'fifo':
+            return ()
+        size = job.estimate if job.estimate is not None else self.average_job_bytes
+        if self.policy == 'priority':
+            return (-job.priority,)
+        if self.policy == 'sjf':
+            return (-job.priority, size)
+        if job.deadline is None:
+            return (-job.priority, 1, 0, size)
+        return (-job.priority, 0, job.deadline - size / self.job_speed, size)
+
+    # --- Bookkeeping, called by the engine under its lock ---
+    def queued(self, job):
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        if job.estimate is None:
+            self.pending_unknown += 1
+        else:
+            self.pending_bytes += job.estimate
+
+    def taken(self, job):
+        if job.estimate is None:
+            self.pending_unknown -= 1
+        else:
+            self.pending_bytes -= job.estimate
+        self._active.add(job)
+
+    def released(self, job):
+        """A job stopped running: it finished, failed, was expanded, or is waiting on post-processing."""
+        if job not in self._active:
+            return
+        self._active.discard(job)
+        if job.status in ("done", "post-processing"):
+            if self.first_result_at is None:
+                self.first_result_at = time.monotonic()
+            self.completed += 1
+            self.completed_bytes += job.metrics.bytes
+            self.transfer_seconds += job.metrics.phases.get('transfer', 0.0)
+
+    # --- Reporting ---
+    @property
+    def time_to_first_result(self):
+        if self.started_at is None or self.first_result_at is None:
+            return None
+        return self.first_result_at - self.started_at
+
+    def items_per_hour(self):
+        if not self.completed or self.started_at is None:
+            return None
+        return self.completed / max(time.monotonic() - self.started_at, 1e-6) * 3600
+
+    def throughput(self):
+        """Bytes per second the whole queue has been moving since the first job was queued."""
+        if self.started_at is None:
+            return None
+        moved = self.completed_bytes + sum(job.progress_bytes for job in list(self._active))
+        elapsed = time.monotonic() - self.started_at
+        return moved / elapsed if moved and elapsed > 0 else None
+
+    def eta(self):
+        """Seconds until every queued and running job is done at the observed throughput, or None."""
+        rate = self.throughput()
+        if not rate:
+            return None
+        average = self.average_job_bytes
+        remaining = self.pending_bytes + self.pending_unknown * average
+        for job in list(self._active):
+            size = job.estimate if job.estimate is not None else average
+            remaining += max(0, size - job.progress_bytes)
+        return remaining / rate
@@ -0,0 +1,426 @@
+# segmented.py
+
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+MIB = 1024 * 1024
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class SegmentTuner:
+    """
+    Process-wide memory of how many connections and what chunk size suit each host.
+    A segmented download starts at the connection count that paid off last time for its host
+    and opens another connection while each extra one still raises the total rate by
+    RAMP_GAIN. Chunks are sized to take about `chunk_seconds` at the measured per-connection
+    speed: slow, high-latency links get small chunks that rebalance well between connections,
+    fast ones get large chunks that amortise the round trip of each request.
+    DASH/HLS downloads use `fragment_connections` concurrent fragments, or what was learned
+    for the host.
+    """
+    RAMP_GAIN = 1.15
+
+    def __init__(self, enabled=True, initial_connections=2, max_connections=8, min_size=4 * MIB,
+                 min_chunk=512 * 1024, max_chunk=32 * MIB, chunk_seconds=2.0, fragment_connections=4):
+        self.enabled = enabled
+        self.initial_connections = max(1, int(initial_connections))
+        self.max_connections = max(self.initial_connections, int(max_connections))
+        self.min_size = min_size
+        self.min_chunk = min_chunk
+        self.max_chunk = max(min_chunk, max_chunk)
+        self.chunk_seconds = chunk_seconds
+        self.fragment_connections = max(1, int(fragment_connections))
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> (connections, bytes/sec per connection)
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the tuner from the `downloader.segmented` section of a ConfigManager."""
+        return cls(enabled=config.get('downloader.segmented.enabled', True),
+                   initial_connections=config.get('downloader.segmented.initial_connections', 2),
+                   max_connections=config.get('downloader.segmented.max_connections', 8),
+                   min_size=config.get('downloader.segmented.min_size', 4 * MIB),
+                   min_chunk=config.get('downloader.segmented.min_chunk', 512 * 1024),
+                   max_chunk=config.get('downloader.segmented.max_chunk', 32 * MIB),
+                   chunk_seconds=config.get('downloader.segmented.chunk_seconds', 2.0),
+                   fragment_connections=config.get('downloader.segmented.fragment_connections', 4))
+
+    def start_connections(self, host):
+        with self._lock:
+            learned = self._hosts.get(host)
+        return learned[0] if learned else self.initial_connections
+
+    def chunk_size(self, host, per_connection_speed=None, cap=None):
+        """Bytes to request at once from a connection running at `per_connection_speed`."""
+        if not per_connection_speed:
+            with self._lock:
+                learned = self._hosts.get(host)
+            per_connection_speed = learned[1] if learned else None
+        size = int(per_connection_speed * self.chunk_seconds) if per_connection_speed else self.min_chunk * 2
+        return max(self.min_chunk, min(size, self.max_chunk, cap or self.max_chunk))
+
+    def fragment_concurrency(self, host):
+        with self._lock:
+            learned = self._hosts.get(host)
+        return min(self.max_connections, max(self.fragment_connections, learned[0] if learned else 1))
+
+    def record(self, host, connections, per_connection_speed):
+        """Remembers the connection count a download settled on and the speed each one reached."""
+        if connections and per_connection_speed:
+            with self._lock:
+                self._hosts[host] = (connections, per_connection_speed)
+
+
+class _Chunk:
+    __slots__ = ('pos', 'end')
+
+    def __init__(self, pos, end):
+        self.pos = pos
+        self.end = end
+
+
+class SegmentMap:
+    """
+    Which byte ranges of a .part file are still missing, shared by the connections filling it.
+    It is saved beside the .part file (as `<part>.segments`) so an interrupted download resumes
+    with only the holes fetched again. The map is on disk before the first byte of the .part file
+    is, so a .part file without one was written by a single connection, front to back. Connections can run at most `slack` bytes ahead of what
+    has been reported through the progress hooks, so throttling a hook throttles them all.
+    """
+    def __init__(self, total, gaps=None):
+        self.total = total
+        self.gaps = gaps if gaps is not None else [[0, total]]
+        self.active = []
+        self.downloaded = total - sum(end - start for start, end in self.gaps)
+        self.reported = self.downloaded
+        self.slack = MIB
+        self.stopped = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    @staticmethod
+    def sidecar(tmpfilename):
+        return tmpfilename + '.segments'
+
+    @classmethod
+    def load(cls, tmpfilename, total):
+        """
+        The saved map for a .part file, or a map assuming its bytes are a contiguous prefix when
+        there is none. A map that cannot be used (unreadable, or for another size) means the
+        .part file may have holes anywhere, so everything is fetched again.
+        """
+        try:
+            with open(cls.sidecar(tmpfilename), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('total') == total:
+                return cls(total, [list(gap) for gap in state['gaps']])
+            return cls(total)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return cls(total)
+        try:
+            have = os.path.getsize(tmpfilename)
+        except OSError:
+            have = 0
+        # A plain single-connection .part file holds the first `have` bytes.
+        return cls(total, [[have, total]] if have < total else [[0, total]])
+
+    def save(self, tmpfilename):
+        with self.cond:
+            gaps = sorted(self.gaps + [[c.pos, c.end] for c in self.active if c.pos < c.end])
+        tmp_path = self.sidecar(tmpfilename) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'total': self.total, 'gaps': gaps}, f)
+        os.replace(tmp_path, self.sidecar(tmpfilename))
+
+    def take(self, chunk_size, min_chunk):
+        """Claims the next range to fetch; at the end, splits the largest range still in flight."""
+        with self.cond:
+            if self.stopped:
+                return None
+            if self.gaps:
+                gap = self.gaps[0]
+                chunk = _Chunk(gap[0], min(gap[1], gap[0] + chunk_size))
+                gap[0] = chunk.end
+                if gap[0] >= gap[1]:
+                    self.gaps.pop(0)
+            else:
+                # Work stealing: an idle connection takes the back half of the slowest remainder.
+                donor = max(self.active, key=lambda c: c.end - c.pos, default=None)
+                if donor is None or donor.end - donor.pos < 2 * min_chunk:
+                    return None
+                middle = donor.pos + (donor.end - donor.pos) // 2
+                chunk = _Chunk(middle, donor.end)
+                donor.end = middle
+            self.active.append(chunk)
+            return chunk
+
+    def release(self, chunk):
+        """Returns whatever a failed or abandoned chunk did not fetch to the gaps."""
+        with self.cond:
+            self.active.remove(chunk)
+            if chunk.pos < chunk.end:
+                self.gaps.append([chunk.pos, chunk.end])
+                self.gaps.sort()
+            self.cond.notify_all()
+
+    def advance(self, chunk, nbytes):
+        with self.cond:
+            # Bytes past a chunk's end (its tail was stolen mid-read) belong to the thief's count.
+            self.downloaded += max(0, min(nbytes, chunk.end - chunk.pos))
+            chunk.pos += nbytes
+            if self.downloaded - self.reported >= self.slack:
+                self.cond.notify_all()
+                while self.downloaded - self.reported >= self.slack and not self.stopped:
+                    self.cond.wait(0.5)
+
+    def stop(self, error=None):
+        with self.cond:
+            self.stopped = True
+            self.error = self.error or error
+            self.cond.notify_all()
+
+    @property
+    def complete(self):
+        return not self.gaps and not self.active and self.downloaded >= self.total
+
+
+_segmented_fd_class = None
+
+
+def segmented_http_fd(yt_dlp):
+    """The yt-dlp file downloader class for segmented HTTP downloads (built on first use)."""
+    global _segmented_fd_class
+    if _segmented_fd_class is not None:
+        return _segmented_fd_class
+    from yt_dlp.downloader.http import HttpFD
+    from yt_dlp.networking import Request
+    from yt_dlp.networking.exceptions import HTTPError, TransportError
+    from yt_dlp.utils.networking import HTTPHeaderDict
+
+    class SegmentedHttpFD(HttpFD):
+        """
+        HttpFD that fetches one file as parallel Range requests over several connections.
+        Falls back to the plain single-connection download when the server does not answer a
+        Range request with 206, or the file is smaller than the tuner's `min_size`.
+        Progress from every connection is reported from the calling thread in HttpFD's shape.
+        """
+        REPORT_INTERVAL = 0.25
+        RAMP_INTERVAL = 1.0
+        SAVE_INTERVAL = 2.0
+
+        tuner = None
+
+        def real_download(self, filename, info_dict):
+            tuner = self.tuner
+            tmpfilename = self.temp_name(filename)
+            headers = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+            size = info_dict.get('filesize') or info_dict.get('filesize_approx')
+            if (tuner is None or not tuner.enabled or self.params.get('test') or 'Range' in headers
+                    or info_dict.get('request_data') or (size and size < tuner.min_size)):
+                return self._single_connection(filename, info_dict, tmpfilename)
+
+            url = info_dict['url']
+            host = urlparse(url).hostname or ''
+            cap = (info_dict.get('downloader_options') or {}).get('http_chunk_size')
+            first = tuner.chunk_size(host, cap=cap)
+            resume = self.params.get('continuedl', True) and os.path.isfile(tmpfilename)
+            start = 0
+            if resume and size:
+                saved = SegmentMap.load(tmpfilename, size)
+                start = saved.gaps[0][0] if saved.gaps else 0
+            # The first range doubles as the probe for Range support and the total size.
+            try:
+                response = self._open_range(url, headers, start, start + first)
+            except (HTTPError, TransportError):
+                return self._single_connection(filename, info_dict, tmpfilename)
+            match = CONTENT_RANGE.match(response.headers.get('Content-Range') or '')
+            if response.status != 206 or not match or int(match.group(1)) != start:
+                response.close()
+                return self._single_connection(filename, info_dict, tmpfilename)
+            total = int(match.group(3))
+
+            segments = SegmentMap.load(tmpfilename, total) if resume else SegmentMap(total)
+            if not segments.gaps or segments.gaps[0][0] != start:
+                response.close()  # The probe does not start the first missing range; fetch afresh
+                response = None
+            if segments.downloaded:
+                self.report_resuming_byte(segments.downloaded)
+            segments.slack = max(MIB, self._block_size() * tuner.max_connections)
+            if not segments.downloaded and os.path.exists(tmpfilename):
+                os.remove(tmpfilename)  # Nothing in it is known to be good: start from an empty file
+            # Saved before any connection writes, so a crash at any point leaves a map of the holes.
+            segments.save(tmpfilename)
+            fd = os.open(tmpfilename, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                if os.fstat(fd).st_size > total:
+                    os.ftruncate(fd, total)
+                return self._run(filename, info_dict, tmpfilename, fd, segments, response, first,
+                                 url, headers, host, cap)
+            finally:
+                if response is not None:
+                    response.close()
+                os.close(fd)
+
+        def _single_connection(self, filename, info_dict, tmpfilename):
+            # A segmented .part file has holes; a single connection can only continue a contiguous one.
+            if os.path.exists(SegmentMap.sidecar(tmpfilename)):
+                for path in (tmpfilename, SegmentMap.sidecar(tmpfilename)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            return super().real_download(filename, info_dict)
+
+        def _block_size(self):
+            # HttpFD grows its reads from `buffersize`; fixed reads must start out large enough.
+            block_size = self.params.get('buffersize') or 1024
+            return block_size if self.params.get('noresizebuffer') else max(block_size, 256 * 1024)
+
+        def _open_range(self, url, headers, start, end):
+            request = Request(url, headers=dict(headers, Range=f'bytes={start}-{end - 1}'))
+            return self.ydl.urlopen(request)
+
+        def _run(self, filename, info_dict, tmpfilename, fd, segments, response, first, url, headers, host, cap):
+            tuner = self.tuner
+            block_size = self._block_size()
+            speed_per_connection = [None]
+            workers = []
+
+            def fetch(chunk, response=None):
+                retries = self.params.get('retries', 10)
+                attempt = 0
+                while chunk.pos < chunk.end and not segments.stopped:
+                    try:
+                        if response is None:
+                            response = self._open_range(url, headers, chunk.pos, chunk.end)
+                            if response.status != 206:
+                                raise TransportError(f'server ignored the Range request (HTTP {response.status})')
+                        # chunk.end can shrink while reading when another connection steals the tail.
+                        while chunk.pos < chunk.end and not segments.stopped:
+                            data = response.read(min(block_size, chunk.end - chunk.pos))
+                            if not data:
+                                raise TransportError('connection closed before the range was complete')
+                            os.pwrite(fd, data, chunk.pos)
+                            segments.advance(chunk, len(data))
+                    except (HTTPError, TransportError, OSError) as e:
+                        attempt += 1
+                        if attempt > retries or (isinstance(e, HTTPError) and e.status < 500 and e.status != 429):
+                            segments.stop(e)
+                            break
+                        time.sleep(min(0.5 * 2 ** attempt, 5.0))
+                    finally:
+                        if response is not None:
+                            response.close()
+                            response = None
+
+            def worker(chunk=None, response=None):
+                while True:
+                    if chunk is None:
+                        chunk = segments.take(tuner.chunk_size(host, speed_per_connection[0], cap), tuner.min_chunk)
+                        if chunk is None:
+                            return
+                    try:
+                        fetch(chunk, response)
+                    finally:
+                        segments.release(chunk)
+                    chunk, response = None, None
+
+            def spawn(chunk=None, response=None):
+                thread = threading.Thread(target=worker, args=(chunk, response), daemon=True,
+                                          name=f"zenith-segment-{len(workers)}")
+                workers.append(thread)
+                thread.start()
+
+            spawn(segments.take(first, tuner.min_chunk) if response is not None else None, response)
+            for _ in range(tuner.start_connections(host) - 1):
+                spawn()
+
+            started = time.time()
+            resumed = segments.downloaded
+            ramping, ramp_rate, settled = True, None, None
+            ramp_at = save_at = time.monotonic()
+            ramp_bytes = segments.downloaded
+            try:
+                while True:
+                    with segments.cond:
+                        segments.cond.wait_for(
+                            lambda: segments.stopped or segments.complete
+                            or segments.downloaded - segments.reported >= segments.slack,
+                            timeout=self.REPORT_INTERVAL)
+                        downloaded = segments.downloaded
+                    now = time.time()
+                    speed = self.calc_speed(started, now, downloaded - resumed)
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'downloaded_bytes': downloaded,
+                        'total_bytes': segments.total,
+                        'tmpfilename': tmpfilename,
+                        'filename': filename,
+                        'eta': self.calc_eta(speed, segments.total - downloaded),
+                        'speed': speed,
+                        'elapsed': now - started,
+                        'ctx_id': info_dict.get('ctx_id'),
+                    }, info_dict)
+                    with segments.cond:
+                        segments.reported = downloaded
+                        segments.cond.notify_all()
+                    if segments.stopped or segments.complete:
+                        break
+
+                    tick = time.monotonic()
+                    if tick - ramp_at >= self.RAMP_INTERVAL:
+                        rate = (downloaded - ramp_bytes) / (tick - ramp_at)
+                        alive = sum(t.is_alive() for t in workers)
+                        if alive:
+                            speed_per_connection[0] = rate / alive
+                        # Keep adding connections while each one still pays for itself.
+                        if ramping and (ramp_rate is None or rate >= ramp_rate * tuner.RAMP_GAIN):
+                            remaining = segments.total - downloaded
+                            if alive < tuner.max_connections and remaining > (alive + 1) * tuner.min_chunk:
+                                spawn()
+                            ramp_rate = rate
+                        elif ramping:
+                            ramping, settled = False, max(1, alive - 1)  # the last one did not pay off
+                        ramp_at, ramp_bytes = tick, downloaded
+                    if tick - save_at >= self.SAVE_INTERVAL:
+                        os.fsync(fd)
+                        segments.save(tmpfilename)
+                        save_at = tick
+            except BaseException:
+                segments.stop()
+                raise
+            finally:
+                segments.stop()
+                for thread in workers:
+                    thread.join()
+                if not segments.complete:
+                    os.fsync(fd)
+                    segments.save(tmpfilename)
+
+            if not segments.complete:
+                self.report_error(f'unable to download {url}: {segments.error}')
+                return False
+            tuner.record(host, settled or len(workers), speed_per_connection[0])
+            try:
+                os.remove(SegmentMap.sidecar(tmpfilename))
+            except FileNotFoundError:
+                pass
+            self.try_rename(tmpfilename, filename)
+            self._hook_progress({
+                'downloaded_bytes': segments.total,
+                'total_bytes': segments.total,
+                'filename': filename,
+                'status': 'finished',
+                'elapsed': time.time() - started,
+                'ctx_id': info_dict.get('ctx_id'),
+            }, info_dict)
+            return True
+
+    _segmented_fd_class = SegmentedHttpFD
+    return _segmented_fd_class
@@ -0,0 +1,104 @@
+# tests/test_engine.py
+"""
+DownloadEngine bookkeeping around the post-processing stage, with download_video replaced by a
+stub so no network or yt-dlp is involved.  Run from the repository root: python -m pytest tests
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+
+import downloader
+from engine import DownloadEngine
+
+
+class InlineStage:
+    """Runs each task as soon as it is submitted, before the download hands the job over."""
+    def submit(self, task, callback, cancel_event=None):
+        callback(task())
+        return True
+
+
+class ThreadStage:
+    """Runs each task on a thread of its own, once ready(url) is true for the job's URL."""
+    def __init__(self, ready=None):
+        self.ready = ready or (lambda url: True)
+        self.url = threading.local()  # set by the download stub, on the worker that submits
+
+    def submit(self, task, callback, cancel_event=None):
+        url = self.url.value
+
+        def run():
+            deadline = time.monotonic() + 5
+            while not self.ready(url) and time.monotonic() < deadline:
+                time.sleep(0)
+            callback(task())
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+def stub_download(stage, results):
+    """A download_video that submits one stage task per attempt; results[n] is (download ok, task ok)."""
+    attempts = []
+
+    def download(url, progress_callback=None, postprocess=None, **options):
+        ok, task_ok = results[min(len(attempts), len(results) - 1)]
+        attempts.append(url)
+        if isinstance(stage, ThreadStage):
+            stage.url.value = url
+        postprocess(lambda: task_ok)
+        return ok
+    return download, attempts
+
+
+def run_engine(monkeypatch, download, stage, urls, max_retries=0, max_workers=2, jobs=None):
+    """Runs `urls` through an engine, filling `jobs` by URL; fails if join() never returns."""
+    monkeypatch.setattr(downloader, 'download_video', download)
+    engine = DownloadEngine({}, max_workers=max_workers, per_host_limit=max_workers, max_retries=max_retries,
+                            expand_playlists=False, postprocess_stage=stage)
+    jobs = {} if jobs is None else jobs
+    finished = threading.Event()
+
+    def run():
+        engine.start()
+        for url in urls:
+            jobs[url] = engine.submit(url)
+        engine.close()
+        engine.join()
+        finished.set()
+    threading.Thread(target=run, daemon=True).start()
+    assert finished.wait(20), "engine.join() did not return"
+    return engine
+
+
+def test_stage_finishing_during_handoff_is_counted_once(monkeypatch):
+    jobs = {}
+    # Each task finishes the moment its job is marked as waiting on the stage.
+    stage = ThreadStage(ready=lambda url: url in jobs and jobs[url].status == "post-processing")
+    download, _ = stub_download(stage, [(True, True)])
+    urls = [f"https://example.com/{n}" for n in range(1000)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often enough to land inside any unlocked gap
+    try:
+        engine = run_engine(monkeypatch, download, stage, urls, max_workers=4, jobs=jobs)
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert (engine.completed, engine.failed, engine.postprocessing) == (1000, 0, 0)
+
+
+@pytest.mark.parametrize('stage_class', [InlineStage, ThreadStage])
+def test_stage_failure_is_final_whenever_it_lands(monkeypatch, stage_class):
+    stage = stage_class()
+    download, attempts = stub_download(stage, [(True, False)])
+    engine = run_engine(monkeypatch, download, stage, ["https://example.com/a"], max_retries=2)
+    assert (engine.completed, engine.failed, engine.retried, len(attempts)) == (0, 1, 0, 1)
+
+
+def test_retry_after_stage_failure_starts_clean(monkeypatch):
+    stage = InlineStage()
+    # First attempt: one video's merge fails and another video's download fails, so the job is retried.
+    download, attempts = stub_download(stage, [(False, False), (True, True)])
+    engine = run_engine(monkeypatch, download, stage, ["https://example.com/a"], max_retries=2)
+    assert (engine.completed, engine.failed, len(attempts)) == (1, 0, 2)
@@ -0,0 +1,76 @@
+# tests/test_formats.py
+"""
+FormatPlanner's choice between a progressive stream, a merge and an audio plan, on hand-written
+format lists in yt-dlp's worst-to-best order.  Run from the repository root: python -m pytest tests
+"""
+
+from formats import REMUX_BYTES_PER_SECOND, FormatPlanner, target_height
+
+
+def video(format_id, height, ext='mp4', vcodec='avc1.64001F', acodec='none', filesize=None):
+    return {'format_id': format_id, 'height': height, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec,
+            'filesize': filesize}
+
+
+def audio(format_id, ext='m4a', acodec='mp4a.40.2', abr=128, filesize=None):
+    return {'format_id': format_id, 'ext': ext, 'vcodec': 'none', 'acodec': acodec, 'abr': abr, 'filesize': filesize}
+
+
+FORMATS = [
+    audio('140', filesize=3_000_000),
+    audio('251', ext='webm', acodec='opus', abr=160, filesize=3_500_000),
+    video('18', 360, acodec='mp4a.40.2'),
+    video('22', 720, acodec='mp4a.40.2'),
+    video('136', 720, filesize=20_000_000),
+    video('137', 1080, filesize=40_000_000),
+    video('313', 2160, ext='webm', vcodec='vp9', filesize=200_000_000),
+]
+
+
+def test_quality_options_map_to_height_caps():
+    assert [target_height(q) for q in ("720p", "480p", "1080p (Best Video)", "Audio Only (MP3)")] == [720, 480, None, None]
+
+
+def test_progressive_stream_at_the_cap_needs_no_merge():
+    plan = FormatPlanner("720p").plan(FORMATS)
+    assert (plan.kind, plan.format_spec, plan.height, plan.ext) == ('progressive', '22', 720, 'mp4')
+
+
+def test_without_prefer_progressive_the_same_height_is_merged():
+    plan = FormatPlanner("720p", prefer_progressive=False).plan(FORMATS)
+    assert (plan.kind, plan.format_spec, plan.ext) == ('merge', '136+140', 'mp4')
+
+
+def test_merge_pairs_video_with_audio_in_a_matching_container():
+    plan = FormatPlanner("1080p").plan(FORMATS)
+    assert (plan.kind, plan.format_spec, plan.height, plan.ext) == ('merge', '137+140', 1080, 'mp4')
+    assert plan.cpu_seconds is not None and plan.cpu_seconds > 0
+
+
+def test_best_video_is_not_capped():
+    plan = FormatPlanner("1080p (Best Video)").plan(FORMATS)
+    assert (plan.kind, plan.format_spec, plan.height) == ('merge', '313+251', 2160)
+
+
+def test_nothing_under_the_cap_settles_for_the_smallest_picture():
+    formats = [audio('140'), video('136', 720), video('137', 1080)]
+    plan = FormatPlanner("480p").plan(formats)
+    assert (plan.kind, plan.format_spec, plan.height) == ('merge', '136+140', 720)
+
+
+def test_without_separate_audio_a_lower_progressive_stream_beats_a_silent_one():
+    formats = [video('18', 360, acodec='mp4a.40.2'), video('137', 1080)]
+    plan = FormatPlanner("1080p").plan(formats)
+    assert (plan.kind, plan.format_spec) == ('progressive', '18')
+
+
+def test_audio_is_re_encoded_to_mp3_unless_native_audio_is_kept():
+    plan = FormatPlanner("Audio Only (MP3)").plan(FORMATS, duration=600)
+    assert (plan.kind, plan.format_spec, plan.audio_action, plan.ext) == ('audio', '251', 'transcode', 'mp3')
+    plan = FormatPlanner("Audio Only (MP3)", keep_native_audio=True).plan(FORMATS, duration=600)
+    assert (plan.format_spec, plan.audio_action, plan.ext, plan.cpu_seconds) == ('251', 'copy', 'opus', 3_500_000 / REMUX_BYTES_PER_SECOND)
+
+
+def test_no_format_list_falls_back_to_yt_dlp():
+    assert FormatPlanner("720p").plan([]).kind == 'fallback'
+    assert FormatPlanner("Audio Only (MP3)").plan([video('18', 360)]).kind == 'fallback'
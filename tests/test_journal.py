@@ -0,0 +1,55 @@
+# tests/test_journal.py
+"""
+JobJournal replay, and resuming its incomplete jobs in a DownloadEngine with download_video replaced
+by a stub.  Run from the repository root: python -m pytest tests
+"""
+
+import threading
+
+import downloader
+from engine import DownloadEngine
+from journal import JobJournal
+
+EXTRA_INFO = {'playlist': 'Feed', 'playlist_index': 3, 'n_entries': 16, 'duration': 120}
+
+
+def test_playlist_fields_survive_a_restart(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = JobJournal(path, fsync=False)
+    job_id = journal.begin("https://example.com/3", {'quality_choice': "720p", 'extra_info': EXTRA_INFO,
+                                                     'download_index': object()})
+    journal.transition(job_id, "downloading")
+    journal.close()
+
+    [entry] = JobJournal(path, fsync=False).incomplete()
+    assert entry.options == {'quality_choice': "720p", 'extra_info': EXTRA_INFO}
+
+
+def test_resumed_entry_keeps_its_playlist_fields(tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.jsonl")
+    journal = JobJournal(path, fsync=False)
+    journal.begin("https://example.com/3", {'quality_choice': "720p", 'extra_info': EXTRA_INFO})
+    journal.close()
+
+    received = []
+
+    def download(url, progress_callback=None, **options):
+        received.append(options.get('extra_info'))
+        return True
+    monkeypatch.setattr(downloader, 'download_video', download)
+    journal = JobJournal(path, fsync=False)
+    engine = DownloadEngine({}, max_workers=1, expand_playlists=False, journal=journal)
+    finished = threading.Event()
+
+    def run():
+        engine.start()
+        engine.close()
+        engine.join()
+        finished.set()
+    threading.Thread(target=run, daemon=True).start()
+    assert finished.wait(20), "engine.join() did not return"
+    journal.close()
+
+    assert (engine.resumed, engine.completed) == (1, 1)
+    assert received == [EXTRA_INFO]
+    assert JobJournal(path, fsync=False).incomplete() == []
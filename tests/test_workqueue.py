@@ -0,0 +1,98 @@
+# tests/test_workqueue.py
+"""
+WorkQueue leases: expiry and reclaim, retries within max_attempts, and fencing of a worker that
+lost its lease, on a clock the tests move by hand.  Run from the repository root: python -m pytest tests
+"""
+
+import pytest
+
+import workqueue
+from workqueue import WorkQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(workqueue, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=3)
+    yield queue
+    queue.close()
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_worker_is_fenced_off(queue, clock):
+    queue.enqueue(["https://example.com/a"])
+    [stale] = queue.claim("box-1")
+    assert queue.claim("box-2") == []  # leased, not yet expired
+
+    clock.now += 61
+    [task] = queue.claim("box-2")
+    assert (task.id, task.attempts) == (stale.id, 2)
+    assert queue.heartbeat("box-1") == 0
+
+    assert queue.complete(stale, "box-1", "done") is None
+    assert queue.counts()['leased'] == 1
+    assert queue.complete(task, "box-2", "done", result={'bytes': 1}) == "done"
+    [record] = queue.results()
+    assert (record['state'], record['result']) == ("done", {'bytes': 1})
+
+
+def test_heartbeats_keep_a_lease(queue, clock):
+    queue.enqueue(["https://example.com/a"])
+    [task] = queue.claim("box-1")
+    for _ in range(3):
+        clock.now += 45
+        assert queue.heartbeat("box-1") == 1
+        assert queue.claim("box-2") == []
+    assert queue.complete(task, "box-1", "done") == "done"
+
+
+def test_a_lease_that_expires_on_every_attempt_fails_the_task(queue, clock):
+    queue.enqueue(["https://example.com/a"])
+    for attempt in range(1, 4):
+        [task] = queue.claim(f"box-{attempt}")
+        assert task.attempts == attempt
+        clock.now += 61
+    assert queue.claim("box-4") == []
+    [record] = queue.results()
+    assert (record['state'], record['error']) == ("failed", "lease expired on every attempt")
+
+
+def test_failures_are_retried_until_max_attempts(queue):
+    queue.enqueue(["https://example.com/a"])
+    states = []
+    while True:
+        tasks = queue.claim("box-1")
+        if not tasks:
+            break
+        states.append(queue.complete(tasks[0], "box-1", "failed", error="HTTP Error 404"))
+    assert states == ["queued", "queued", "failed"]
+
+
+def test_release_does_not_use_up_an_attempt(queue):
+    queue.enqueue(["https://example.com/a"])
+    [task] = queue.claim("box-1")
+    assert queue.release(task, "box-1")
+    [task] = queue.claim("box-2")
+    assert task.attempts == 1
+
+
+def test_a_report_from_an_earlier_attempt_of_the_same_worker_is_fenced_off(queue, clock):
+    queue.enqueue(["https://example.com/a"])
+    [first] = queue.claim("box-1")
+    clock.now += 61
+    [second] = queue.claim("box-1")
+    assert queue.complete(first, "box-1", "failed", error="stalled") is None
+    assert queue.complete(second, "box-1", "done") == "done"
@@ -0,0 +1,320 @@
+# workqueue.py
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+
+from ingest import url_key
+
+TASK_STATES = ("queued", "leased", "done", "failed", "expanded")
+TASK_COLUMNS = ('id', 'url', 'options', 'state', 'attempts', 'worker', 'lease_until', 'parent', 'error', 'result')
+
+
+class Task:
+    """One claimed row of the work queue; `attempts` doubles as the lease's fencing token."""
+    def __init__(self, id, url, options, attempts, parent=None):
+        self.id = id
+        self.url = url
+        self.options = options
+        self.attempts = attempts
+        self.parent = parent
+
+
+class WorkQueue:
+    """
+    A job queue in one SQLite file that several processes, on one machine or on several
+    sharing the file, claim work from.
+    Each claim is a lease: the worker renews it with heartbeats while the job runs, and a lease
+    that runs out (the worker died or lost the file) is queued again by the next claim, until a
+    task has had `max_attempts`. Reports are fenced by worker and attempt, so a worker that lost
+    its lease cannot overwrite the result of the one that took the task over.
+    URLs are de-duplicated by their ingest.url_key, so enqueuing the
+    same links file twice, or a video that two playlists share, queues it once.
+    The rollback journal is used rather than WAL, which needs shared memory that network filesystems lack.
+    """
+    def __init__(self, db_path="zenith_queue.db", lease_seconds=120.0, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+        self._lock = threading.Lock()
+        # Autocommit mode: claims open their own BEGIN IMMEDIATE so two workers never read the same rows.
+        self._conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key         TEXT NOT NULL UNIQUE,
+                    url         TEXT NOT NULL,
+                    options     TEXT NOT NULL DEFAULT '{}',
+                    priority    INTEGER NOT NULL DEFAULT 0,
+                    deadline    REAL,
+                    state       TEXT NOT NULL DEFAULT 'queued',
+                    attempts    INTEGER NOT NULL DEFAULT 0,
+                    worker      TEXT,
+                    lease_until REAL,
+                    parent      INTEGER,
+                    error       TEXT,
+                    result      TEXT,
+                    created_at  REAL NOT NULL,
+                    updated_at  REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (state, priority DESC, deadline, id)")
+
+    @classmethod
+    def from_config(cls, config, db_path=None):
+        """Opens the queue named by the `downloader.work_queue` section."""
+        return cls(db_path or config.get('downloader.work_queue.path', 'zenith_queue.db'),
+                   lease_seconds=config.get('downloader.work_queue.lease_seconds', 120),
+                   max_attempts=config.get('downloader.work_queue.max_attempts', 3))
+
+    def _write(self, fn):
+        """Runs fn(cursor) in an immediate (write-locked) transaction and returns its result."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(cursor)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    # --- Producers ---
+    def enqueue(self, items, parent=None, batch_size=1000):
+        """
+        Queues URLs or (url, options) pairs, in batches of one transaction each so a huge links
+        file neither holds the write lock for long nor needs to fit in memory.
+        Returns how many were new.
+        """
+        added, batch = 0, []
+        for item in items:
+            url, options = item if isinstance(item, tuple) else (item, {})
+            now = time.time()
+            batch.append((url_key(url), url, json.dumps(options), int(options.get('priority', 0)),
+                          options.get('deadline'), parent, now, now))
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        if batch:
+            added += self._insert(batch)
+        return added
+
+    def _insert(self, rows):
+        def insert(cursor):
+            before = cursor.execute("SELECT total_changes()").fetchone()[0]
+            cursor.executemany("""
+                INSERT OR IGNORE INTO tasks (key, url, options, priority, deadline, parent, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+            return cursor.execute("SELECT total_changes()").fetchone()[0] - before
+        return self._write(insert)
+
+    def retry_failed(self):
+        """Queues every failed task again with a fresh attempt budget; returns how many."""
+        return self._write(lambda cursor: cursor.execute(
+            "UPDATE tasks SET state = 'queued', attempts = 0, error = NULL, updated_at = ? WHERE state = 'failed'",
+            (time.time(),)).rowcount)
+
+    # --- Workers ---
+    def claim(self, worker, limit=1):
+        """Leases up to `limit` tasks to `worker`, highest priority and earliest deadline first."""
+        def claim(cursor):
+            now = time.time()
+            self._expire(cursor, now)
+            rows = cursor.execute("""
+                SELECT id, url, options, attempts, parent FROM tasks WHERE state = 'queued'
+                ORDER BY priority DESC, deadline IS NULL, deadline, id LIMIT ?""", (int(limit),)).fetchall()
+            tasks = []
+            for id, url, options, attempts, parent in rows:
+                cursor.execute("""
+                    UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = ?, updated_at = ?
+                    WHERE id = ?""", (worker, now + self.lease_seconds, attempts + 1, now, id))
+                tasks.append(Task(id, url, json.loads(options), attempts + 1, parent))
+            return tasks
+        return self._write(claim)
+
+    def _expire(self, cursor, now):
+        """Queues the tasks of leases that ran out again, or fails them once out of attempts."""
+        cursor.execute("""
+            UPDATE tasks SET state = 'failed', worker = NULL, lease_until = NULL, updated_at = ?,
+                             error = 'lease expired on every attempt'
+            WHERE state = 'leased' AND lease_until < ? AND attempts >= ?""", (now, now, self.max_attempts))
+        cursor.execute("""
+            UPDATE tasks SET state = 'queued', worker = NULL, lease_until = NULL, updated_at = ?
+            WHERE state = 'leased' AND lease_until < ?""", (now, now))
+
+    def heartbeat(self, worker):
+        """Renews every lease `worker` holds; returns how many it still holds."""
+        now = time.time()
+        return self._write(lambda cursor: cursor.execute(
+            "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE state = 'leased' AND worker = ?",
+            (now + self.lease_seconds, now, worker)).rowcount)
+
+    def complete(self, task, worker, state, error=None, result=None):
+        """
+        Reports a leased task's outcome ('done', 'failed' or 'expanded'). A failure with attempts
+        left is queued again, for any worker: the task's attempts are its only retry budget.
+        Returns the state recorded ('queued' for such a retry), or None if the lease was no longer this worker's.
+        """
+        if state == "failed" and task.attempts < self.max_attempts:
+            state = "queued"
+        now = time.time()
+        updated = self._write(lambda cursor: cursor.execute("""
+            UPDATE tasks SET state = ?, worker = NULL, lease_until = NULL, error = ?, result = ?, updated_at = ?
+            WHERE id = ? AND worker = ? AND attempts = ? AND state = 'leased'""",
+            (state, error, json.dumps(result, default=str) if result is not None else None, now,
+             task.id, worker, task.attempts)).rowcount)
+        return state if updated == 1 else None
+
+    def release(self, task, worker):
+        """Hands a task that was not worked on back to the queue, without using up an attempt."""
+        now = time.time()
+        return self._write(lambda cursor: cursor.execute("""
+            UPDATE tasks SET state = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1, updated_at = ?
+            WHERE id = ? AND worker = ? AND attempts = ? AND state = 'leased'""",
+            (now, task.id, worker, task.attempts)).rowcount == 1)
+
+    # --- Reporting ---
+    def counts(self):
+        """Tasks per state, every state included."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict({state: 0 for state in TASK_STATES}, **dict(rows))
+
+    def workers(self):
+        """Per worker: tasks it holds now, from leases."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker, COUNT(*), MAX(lease_until) FROM tasks WHERE state = 'leased' GROUP BY worker").fetchall()
+        return {worker: {'leased': count, 'lease_until': until} for worker, count, until in rows}
+
+    def results(self, state=None, limit=20):
+        """The most recently reported tasks as dicts, optionally of one state."""
+        where, params = ("WHERE state = ?", (state, limit)) if state else ("WHERE state != 'queued' AND state != 'leased'", (limit,))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks {where} ORDER BY updated_at DESC LIMIT ?",
+                                      params).fetchall()
+        records = []
+        for row in rows:
+            record = dict(zip(TASK_COLUMNS, row))
+            record['options'] = json.loads(record['options'])
+            record['result'] = json.loads(record['result']) if record['result'] else None
+            records.append(record)
+        return records
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def worker_name():
+    """host-pid-random: unique per process, and says which machine holds a lease."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class QueueWorker:
+    """
+    Feeds a DownloadEngine from a WorkQueue: claims tasks while the engine has idle workers,
+    keeps their leases alive from a heartbeat thread, and reports each job's final status and
+    metrics back to the queue. Playlists are expanded into the shared queue (wire `fan_out` as
+    the engine's entry_sink), so their entries spread over every node rather than one.
+    On a halt, every task without a final status is handed back without using up an attempt;
+    whichever worker claims one next continues its partial files if the output folder is shared.
+    """
+    def __init__(self, work_queue, heartbeat_interval=30.0, name=None):
+        self.queue = work_queue
+        self.heartbeat_interval = float(heartbeat_interval)
+        self.name = name or worker_name()
+        self._lock = threading.Lock()
+        self._tasks = {}  # engine job_id -> Task
+        self.claimed = 0
+        self.reported = Counter()  # by the state recorded: 'queued' is a failure handed back for a retry
+        self.lost = 0  # reports refused because the lease had passed to another worker
+        self._finished = threading.Event()
+        self._heartbeat = None
+
+    @classmethod
+    def from_config(cls, config, work_queue):
+        return cls(work_queue, heartbeat_interval=config.get('downloader.work_queue.heartbeat_interval', 30))
+
+    def start(self):
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="zenith-heartbeat", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def feed(self, engine, stop_event, poll_interval=5.0, exit_when_idle=False):
+        """
+        Claims tasks whenever the engine has idle workers, until `stop_event` is set or, with
+        exit_when_idle, nothing is left queued or leased anywhere.
+        """
+        while not stop_event.is_set():
+            idle = engine.max_workers - engine.active - engine.pending
+            tasks = self.queue.claim(self.name, idle) if idle > 0 else []
+            for task in tasks:
+                self._submit(engine, task)
+            with self._lock:
+                busy = bool(self._tasks)
+            if not tasks and not busy and exit_when_idle:
+                counts = self.queue.counts()
+                if not counts['queued'] and not counts['leased']:
+                    return
+            # Poll again soon while jobs run here, slowly once the queue has run dry.
+            stop_event.wait(0.5 if tasks or busy else poll_interval)
+
+    def finish(self):
+        """Once the engine has joined: hands back tasks left without a final status and stops the heartbeats."""
+        with self._lock:
+            left = list(self._tasks.values())
+            self._tasks.clear()
+        for task in left:
+            self.queue.release(task, self.name)
+        self._finished.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+
+    def _submit(self, engine, task):
+        with self._lock:
+            self.claimed += 1
+        job = engine.submit(task.url, task.options)
+        if job is None:
+            self.queue.release(task, self.name)  # Same URL already running here
+            return
+        with self._lock:
+            self._tasks[job.job_id] = task
+
+    def _heartbeat_loop(self):
+        while not self._finished.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(self.name)
+            except sqlite3.Error as e:
+                print(f"[Queue] Heartbeat failed: {e}")  # Retried next beat, well within the lease
+
+    # --- Engine callbacks ---
+    def on_job(self, job):
+        """Engine job_callback: reports final statuses."""
+        if job.status not in ("done", "failed", "expanded"):
+            return
+        with self._lock:
+            task = self._tasks.pop(job.job_id, None)
+        if task is None:
+            return
+        result = dict(job.metrics.to_dict(), worker=self.name, entries=job.children or None)
+        error = str(job.error) if job.error else (job.metrics.error_class if job.status == "failed" else None)
+        state = self.queue.complete(task, self.name, job.status, error=error, result=result)
+        if state is not None:
+            with self._lock:
+                self.reported[state] += 1
+        else:
+            with self._lock:
+                self.lost += 1
+
+    def fan_out(self, job, entries):
+        """Engine entry_sink: queues a playlist's entries on the shared queue; returns how many were new."""
+        with self._lock:
+            task = self._tasks.get(job.job_id)
+        return self.queue.enqueue(entries, parent=task.id if task is not None else None)